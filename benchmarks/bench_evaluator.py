@@ -0,0 +1,256 @@
+# benchmarks/bench_evaluator.py
+"""
+Scaling benchmark for the server-side evaluator on synthetic trees.
+
+For every case (feature dimension, max depth, max leaf count) a decision
+tree is trained on noisy synthetic data and pushed through the same steps
+as convert_tree.py / build_matrices.py / fhe_logic.py, each timed on its own:
+
+  extract, simplify, build_matrices, compile   (offline model preparation)
+  deserialize_context, deserialize_input       (per request)
+  dot, scalar_multiply, add, serialize         (homomorphic ops, summed)
+  evaluate                                     (evaluate_decision_like end to end)
+
+Everything runs in-process with local TenSEAL contexts (FHE_PARAMS), no
+HTTP. Each stage is reported as the best of --repeats runs.
+
+Results are compared with a stored baseline (--baseline). A stage is a
+regression when it is slower than the baseline by more than --threshold
+(relative) and the baseline is above --min-ms (shorter stages are mostly
+noise); the script then exits with status 1.
+
+Baselines are machine specific, so none is committed: benchmarks/baselines/
+is git-ignored. Record one with --update-baseline on the machine that runs
+the comparison (or point --baseline at a file that machine keeps between
+runs). Without a baseline the results are only printed; pass
+--require-baseline (e.g. in CI) to make that an error (status 2).
+
+Usage (from project root):
+  python -m benchmarks.bench_evaluator --update-baseline
+  python -m benchmarks.bench_evaluator --threshold 0.2 --require-baseline
+  python -m benchmarks.bench_evaluator --suite quick --cases f4_
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import tenseal as ts
+from sklearn.datasets import make_classification
+from sklearn.tree import DecisionTreeClassifier
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "server"))
+
+import fhe_logic
+from build_matrices import build_decision_matrices
+from client.fhe_encrypt import create_context_with_secret, serialize_public_context
+from convert_tree import extract_tree
+from profiling import OpStats
+from shared.config import FHE_PARAMS
+from simplify_tree import simplify_tree
+
+DEFAULT_BASELINE = os.path.join(PROJECT_ROOT, "benchmarks", "baselines", "evaluator.json")
+
+# (n_features, max_depth, max_leaf_nodes). Responses hold two ciphertexts of
+# ~230 KB per node/leaf (hex + JSON on top), so "full" needs a few GB of RAM.
+SUITES = {
+    "quick": [(4, 3, 8), (16, 6, 16)],
+    "default": [(4, 3, 8), (4, 6, 32), (16, 6, 32), (64, 6, 32), (16, 8, 64)],
+}
+SUITES["full"] = SUITES["default"] + [(16, 10, 128), (64, 12, 256)]
+
+_OPS = ("dot", "scalar_multiply", "add", "serialize")
+
+
+def case_name(n_features: int, max_depth: int, max_leaf_nodes: int) -> str:
+    return f"f{n_features}_d{max_depth}_l{max_leaf_nodes}"
+
+
+def train_synthetic_tree(n_features: int, max_depth: int, max_leaf_nodes: int, seed: int = 0):
+    """Fit a tree that actually reaches the requested size (noisy labels)."""
+    X, y = make_classification(
+        n_samples=max(2000, 20 * max_leaf_nodes),
+        n_features=n_features,
+        n_informative=min(n_features, 8),
+        n_redundant=0,
+        n_classes=3,
+        n_clusters_per_class=2,
+        flip_y=0.1,
+        random_state=seed,
+    )
+    clf = DecisionTreeClassifier(max_depth=max_depth, max_leaf_nodes=max_leaf_nodes,
+                                 random_state=seed).fit(X, y)
+    return clf, X
+
+
+def _best_of(repeats: int, fn, *args, **kwargs):
+    """(result of the last call, best wall time in ms)."""
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - t0)
+    return result, best * 1000
+
+
+def run_case(n_features: int, max_depth: int, max_leaf_nodes: int, ctx, public_ctx_bytes: bytes,
+             repeats: int = 3, simplify: bool = True, seed: int = 0) -> dict:
+    """Time every stage for one synthetic tree; returns {"tree": ..., "stages_ms": ...}."""
+    clf, X = train_synthetic_tree(n_features, max_depth, max_leaf_nodes, seed)
+    stages = {}
+
+    tree, stages["extract"] = _best_of(repeats, extract_tree, clf)
+    if simplify:
+        (tree, _), stages["simplify"] = _best_of(repeats, simplify_tree, tree)
+    fhe_mats, stages["build_matrices"] = _best_of(repeats, build_decision_matrices, tree, verbose=False)
+    model, stages["compile"] = _best_of(repeats, fhe_logic.compile_model, fhe_mats)
+
+    model_id = "bench_" + case_name(n_features, max_depth, max_leaf_nodes)
+    fhe_logic.register_model(model_id, fhe_mats)
+
+    ct_bytes = ts.ckks_vector(ctx, X[0].tolist() + [1.0]).serialize()
+    eval_ctx, stages["deserialize_context"] = _best_of(
+        repeats, fhe_logic.deserialize_context, public_ctx_bytes)
+    _, stages["deserialize_input"] = _best_of(
+        repeats, fhe_logic._deserialize_ckks_vector, eval_ctx, ct_bytes)
+
+    # Per-op totals from one profiled run, end-to-end time from unprofiled runs
+    op_stats = OpStats()
+    fhe_logic.evaluate_decision_like(public_ctx_bytes, ct_bytes, op_stats=op_stats, model_id=model_id)
+    for op in _OPS:
+        stages[op] = op_stats.times.get(op, 0.0) * 1000
+    out, stages["evaluate"] = _best_of(
+        repeats, fhe_logic.evaluate_decision_like, public_ctx_bytes, ct_bytes, model_id=model_id)
+
+    stats = fhe_logic.model_stats(model_id)
+    return {
+        "tree": {
+            "n_features": n_features,
+            "depth": int(clf.get_depth()),
+            "nodes": stats["num_nodes"],
+            "leaves": stats["num_leaves"],
+            "path_terms": stats["path_terms"],
+            "dots": op_stats.counts.get("dot", 0),
+            "response_bytes": len(out),
+        },
+        "stages_ms": stages,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_ms: float) -> list:
+    """Return (case, stage, baseline_ms, current_ms) for every regression."""
+    regressions = []
+    for case, result in results.items():
+        base_stages = baseline.get("cases", {}).get(case, {}).get("stages_ms", {})
+        for stage, ms in result["stages_ms"].items():
+            base_ms = base_stages.get(stage)
+            if base_ms is None or base_ms < min_ms:
+                continue
+            if ms > base_ms * (1 + threshold):
+                regressions.append((case, stage, base_ms, ms))
+    return regressions
+
+
+def _print_case(case: str, result: dict, baseline: dict):
+    tree = result["tree"]
+    print(f"\n{case}: depth {tree['depth']}, {tree['nodes']} nodes, {tree['leaves']} leaves, "
+          f"{tree['path_terms']} path terms, {tree['dots']} dots, "
+          f"response {tree['response_bytes'] / 2**20:.1f} MB")
+    base_stages = baseline.get("cases", {}).get(case, {}).get("stages_ms", {}) if baseline else {}
+    print(f"  {'stage':<20} {'ms':>10} {'baseline':>10} {'change':>8}")
+    for stage, ms in result["stages_ms"].items():
+        base_ms = base_stages.get(stage)
+        if base_ms:
+            print(f"  {stage:<20} {ms:>10.2f} {base_ms:>10.2f} {ms / base_ms - 1:>+8.0%}")
+        else:
+            print(f"  {stage:<20} {ms:>10.2f} {'-':>10} {'':>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FHE evaluator on synthetic trees.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="default")
+    parser.add_argument("--cases", help="only run cases whose name contains this string (e.g. f16_)")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per stage (best is kept)")
+    parser.add_argument("--no-simplify", action="store_true",
+                        help="benchmark the sklearn trees verbatim (skip simplify_tree)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write the results to --baseline instead of comparing")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="exit with status 2 if --baseline does not exist")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative slowdown per stage (0.25 = 25%%)")
+    parser.add_argument("--min-ms", type=float, default=1.0,
+                        help="ignore stages whose baseline is shorter than this")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    cases = [c for c in SUITES[args.suite] if not args.cases or args.cases in case_name(*c)]
+    if not cases:
+        parser.error(f"no case in suite {args.suite!r} matches {args.cases!r}")
+
+    if args.require_baseline and not args.update_baseline and not os.path.exists(args.baseline):
+        parser.error(f"no baseline at {args.baseline}; record one with --update-baseline")
+
+    baseline = None
+    if not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("fhe_params") != FHE_PARAMS:
+            print(f"⚠️  Baseline was recorded with different FHE_PARAMS: {baseline.get('fhe_params')}")
+
+    ctx = create_context_with_secret()
+    public_ctx_bytes = serialize_public_context(ctx)
+
+    results = {}
+    for c in cases:
+        name = case_name(*c)
+        results[name] = run_case(*c, ctx, public_ctx_bytes, repeats=args.repeats,
+                                 simplify=not args.no_simplify, seed=args.seed)
+        _print_case(name, results[name], baseline)
+
+    report = {
+        "fhe_params": FHE_PARAMS,
+        "simplify": not args.no_simplify,
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "cases": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        if os.path.exists(args.baseline):
+            # Keep cases that were not re-run (e.g. with --cases)
+            with open(args.baseline) as f:
+                report["cases"] = {**json.load(f).get("cases", {}), **results}
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Baseline written to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; record one with --update-baseline.")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold, args.min_ms)
+    if regressions:
+        print(f"\n❌ {len(regressions)} stage(s) slower than baseline by more than {args.threshold:.0%}:")
+        for case, stage, base_ms, ms in regressions:
+            print(f"   {case} {stage}: {base_ms:.2f} ms -> {ms:.2f} ms ({ms / base_ms - 1:+.0%})")
+        return 1
+    print(f"\n✅ No stage slower than baseline by more than {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# benchmarks/bench_payload.py
+"""
+Compare the old split()-based payload parsing with the offset-based
+server/payload_codec.py on synthetic multi-MB contexts.
+
+Measures the server-side unwrap after AES-GCM decryption, i.e. outer
+base64 decode of the JSON "ct" string plus extraction of the context and
+ciphertext fields. Peak memory is the tracemalloc peak above the live
+input, which tracks the transient copies made while parsing.
+
+Usage (from project root):
+  python -m benchmarks.bench_payload
+"""
+
+import base64
+import binascii
+import os
+import sys
+import time
+import tracemalloc
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "server"))
+
+from payload_codec import split_fhe_payload
+
+
+def _legacy_unwrap(ct_b64: str):
+    decrypted = base64.b64decode(ct_b64)
+    parts = decrypted.split(b"::")
+    return base64.b64decode(parts[1]), base64.b64decode(parts[3])
+
+
+def _zero_copy_unwrap(ct_b64: str):
+    decrypted = binascii.a2b_base64(ct_b64)
+    return split_fhe_payload(decrypted)
+
+
+def _measure(fn, arg, repeats: int):
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn(arg)
+    return peak, (time.perf_counter() - t0) / repeats
+
+
+def main(ctx_sizes_mb=(1, 4, 16), ct_size_kb=256, repeats=10):
+    print(f"{'ctx MB':>7} | {'legacy peak MB':>14} {'legacy ms':>10} | "
+          f"{'new peak MB':>11} {'new ms':>8} | {'peak saved':>10}")
+    for mb in ctx_sizes_mb:
+        ctx = os.urandom(mb * 1024 * 1024)
+        ct = os.urandom(ct_size_kb * 1024)
+        wrapped = (b"TS_CTX::" + base64.b64encode(ctx)
+                   + b"::TS_CT::" + base64.b64encode(ct))
+        ct_b64 = base64.b64encode(wrapped).decode()
+
+        assert _legacy_unwrap(ct_b64) == _zero_copy_unwrap(ct_b64)
+
+        old_peak, old_t = _measure(_legacy_unwrap, ct_b64, repeats)
+        new_peak, new_t = _measure(_zero_copy_unwrap, ct_b64, repeats)
+        print(f"{mb:>7} | {old_peak / 2**20:>14.1f} {old_t * 1000:>10.2f} | "
+              f"{new_peak / 2**20:>11.1f} {new_t * 1000:>8.2f} | "
+              f"{1 - new_peak / old_peak:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# client/batch_score.py
+"""
+Streaming offline batch scoring over the FHE pipeline.
+
+Reads feature rows from a .npy or .csv file in chunks and pushes them through
+a bounded three-stage pipeline:
+
+  1) encrypt  - worker pool, builds the AES-wrapped /infer request body
+  2) send     - limited number of concurrent HTTP requests
+  3) decrypt  - main thread, traverses the tree decrypting only the node
+                scores on the path
+
+Predictions are appended to the output CSV in input order as soon as they are
+available, so an interrupted run can be resumed with --resume. At most
+--max-in-flight rows are held in each stage, which keeps memory flat
+regardless of the input size.
+
+Usage (from project root, with the server running):
+  python -m client.batch_score server/model/X_test.npy predictions.csv
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from client.client import (
+    build_request_json,
+    generate_idempotency_key,
+    generate_nonce,
+    lazy_node_scores,
+    post_request,
+)
+from client.fhe_encrypt import EncryptionPool, create_context_with_secret, serialize_public_context
+from client.transport import HttpTransport, ServerBusy, get_transport
+from client.tree_traversal import plaintext_traverse_from_scores
+
+
+def iter_rows(path: str, chunk_size: int = 1024, skip: int = 0):
+    """
+    Yield (row_index, features) from a .npy or .csv file, reading chunk_size
+    rows at a time. The first 'skip' rows are not yielded.
+
+    A CSV may start with one header line; any other non-numeric line raises
+    ValueError with its line number.
+    """
+    if path.endswith(".npy"):
+        # Memory-mapped: only the current chunk is paged in
+        data = np.load(path, mmap_mode="r")
+        for start in range(skip, len(data), chunk_size):
+            chunk = np.asarray(data[start:start + chunk_size], dtype=float)
+            for offset, row in enumerate(chunk):
+                yield start + offset, row.tolist()
+        return
+
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        idx = 0
+        first = True
+        for record in reader:
+            if not record:
+                continue
+            try:
+                row = [float(v) for v in record]
+            except ValueError:
+                # Only a leading header line may be non-numeric; dropping any
+                # other line would shift every later row index
+                if first:
+                    first = False
+                    continue
+                raise ValueError(f"{path}:{reader.line_num}: non-numeric value in data row: {record}")
+            first = False
+            if idx >= skip:
+                yield idx, row
+            idx += 1
+
+
+def prepare_resume(out_path: str) -> int:
+    """
+    Get out_path ready for appending and return the number of input rows
+    already scored (last row id written + 1).
+
+    A run killed mid-write can leave a partial last line; it is cut off so
+    that row is scored again. Returns 0 if there is no complete data line.
+    """
+    if not os.path.exists(out_path):
+        return 0
+    with open(out_path, "r+b") as f:
+        # Read backwards until the last complete line is wholly in 'tail'
+        pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0 and tail.count(b"\n") < 2:
+            step = min(64 * 1024, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+        complete = tail[:tail.rfind(b"\n") + 1]
+        f.truncate(pos + len(complete))
+
+    lines = complete.splitlines()
+    if not lines or lines[-1].startswith(b"row"):
+        return 0
+    return int(lines[-1].split(b",", 1)[0]) + 1
+
+
+def _encrypt_row(ctx, public_ctx_bytes, pool, features):
+    vector = list(features) + [1.0]
+    return build_request_json(ctx, vector, public_ctx_bytes=public_ctx_bytes, pool=pool,
+                              idempotency_key=generate_idempotency_key())
+
+
+def _post_with_backoff(json_data, transport, retries: int, busy_retries: int, max_backoff: float):
+    """
+    post_request, but a 429/503 from the server's admission control is
+    retried up to busy_retries times instead of failing the whole run.
+    Waits for Retry-After if the server sent it, else for an exponential
+    backoff with jitter, capped at max_backoff seconds.
+    """
+    for attempt in range(busy_retries + 1):
+        try:
+            return post_request(json_data, retries=retries, transport=transport)
+        except ServerBusy as e:
+            if attempt == busy_retries:
+                raise
+            backoff = min(max_backoff, 0.5 * 2 ** attempt) * (0.5 + random.random())
+            time.sleep(min(max_backoff, e.retry_after) if e.retry_after is not None else backoff)
+            # The rejected request's nonce may have been recorded
+            json_data = dict(json_data, nonce=generate_nonce(), timestamp=time.time())
+
+
+def score_file(
+    in_path: str,
+    out_path: str,
+    server: str = None,
+    encrypt_workers: int = 2,
+    send_concurrency: int = 4,
+    max_in_flight: int = 32,
+    chunk_size: int = 1024,
+    resume: bool = False,
+    timeout: float = 10,
+    pool_size: int = 64,
+    retries: int = 2,
+    busy_retries: int = 10,
+    max_backoff: float = 30,
+):
+    """
+    Score every row of in_path and write "row,prediction" lines to out_path.
+    Requests go over HTTP to 'server' if given, else over the transport
+    configured in shared/config.py. Rows the server turns away as busy
+    (429/503) are resent with backoff (see _post_with_backoff).
+    Returns the number of rows scored in this run.
+    """
+    transport = HttpTransport(server, timeout) if server else get_transport()
+
+    skip = prepare_resume(out_path) if resume else 0
+    mode = "a" if skip else "w"
+
+    # One secret-key context for the whole run; public part serialized once
+    ctx = create_context_with_secret()
+    public_ctx_bytes = serialize_public_context(ctx)
+
+    rows = iter_rows(in_path, chunk_size=chunk_size, skip=skip)
+    first = next(rows, None)
+    if first is not None and pool_size > 0:
+        # Precomputed encryptions of zero, refilled in the background
+        pool = EncryptionPool(ctx, len(first[1]) + 1, max_size=pool_size)
+    else:
+        pool = None
+
+    encrypting = deque()   # (row_idx, future -> request json)
+    sending = deque()      # (row_idx, future -> decoded result)
+    scored = 0
+    t0 = time.perf_counter()
+
+    with open(out_path, mode, newline="") as out_f, \
+            ThreadPoolExecutor(max_workers=encrypt_workers) as enc_pool, \
+            ThreadPoolExecutor(max_workers=send_concurrency) as send_pool:
+        writer = csv.writer(out_f)
+        if not skip:
+            writer.writerow(["row", "prediction"])
+
+        def drain_one_send():
+            nonlocal scored
+            idx, fut = sending.popleft()
+            out = fut.result()
+            scores = lazy_node_scores(ctx, out)
+            writer.writerow([idx, plaintext_traverse_from_scores(scores)])
+            scored += 1
+            if scored % chunk_size == 0:
+                out_f.flush()
+                rate = scored / (time.perf_counter() - t0)
+                print(f"Scored {skip + scored} rows ({rate:.1f} rows/s)...")
+
+        def drain_one_encrypt():
+            idx, fut = encrypting.popleft()
+            sending.append(
+                (idx, send_pool.submit(_post_with_backoff, fut.result(), transport,
+                                       retries, busy_retries, max_backoff))
+            )
+            # Decrypt in order; waiting on the head bounds the send stage
+            while sending and (sending[0][1].done() or len(sending) >= max_in_flight):
+                drain_one_send()
+
+        for idx, features in itertools.chain([first] if first else [], rows):
+            encrypting.append(
+                (idx, enc_pool.submit(_encrypt_row, ctx, public_ctx_bytes, pool, features))
+            )
+            while encrypting and (encrypting[0][1].done() or len(encrypting) >= max_in_flight):
+                drain_one_encrypt()
+
+        while encrypting:
+            drain_one_encrypt()
+        while sending:
+            drain_one_send()
+
+    if pool is not None:
+        pool.close()
+
+    elapsed = time.perf_counter() - t0
+    print(f"Done: {scored} rows scored in {elapsed:.2f} s "
+          f"({skip} rows skipped from previous run)")
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a feature file through FHE inference.")
+    parser.add_argument("input", help=".npy or .csv file of feature rows (no bias column)")
+    parser.add_argument("output", help="CSV file to write row,prediction lines to")
+    parser.add_argument("--server", help="/infer URL (default: transport from shared/config.py)")
+    parser.add_argument("--encrypt-workers", type=int, default=2)
+    parser.add_argument("--send-concurrency", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=32,
+                        help="max rows buffered in each pipeline stage")
+    parser.add_argument("--chunk-size", type=int, default=1024,
+                        help="rows read from the input file at a time")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--retries", type=int, default=2,
+                        help="resends per row after a timeout (served from the server's result cache)")
+    parser.add_argument("--busy-retries", type=int, default=10,
+                        help="resends per row after a 429/503 (server overloaded)")
+    parser.add_argument("--max-backoff", type=float, default=30,
+                        help="longest wait in seconds before resending a busy row")
+    parser.add_argument("--pool-size", type=int, default=64,
+                        help="precomputed zero encryptions to keep ready (0 disables)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip rows already present in the output file")
+    args = parser.parse_args()
+
+    score_file(
+        args.input,
+        args.output,
+        server=args.server,
+        encrypt_workers=args.encrypt_workers,
+        send_concurrency=args.send_concurrency,
+        max_in_flight=args.max_in_flight,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+        timeout=args.timeout,
+        pool_size=args.pool_size,
+        retries=args.retries,
+        busy_retries=args.busy_retries,
+        max_backoff=args.max_backoff,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import base64
 import os
 import sys
 import time
+import uuid
 
 import requests
 import numpy as np
@@ -17,13 +18,19 @@ if PROJECT_ROOT not in sys.path:
 from client.fhe_encrypt import (
     create_context_with_secret,
     encrypt_vector_and_serialize,
+    get_persistent_context,
+    get_persistent_public_context_bytes,
     serialize_public_context,
 )
 from client.security import encrypt_payload
 from client.load_leaf_outputs import load_leaf_outputs 
+from client.transport import INFER, MULTI, HttpTransport, get_transport
 from client.tree_traversal import plaintext_traverse_from_scores
+from shared.config import TRANSPORT
+from shared.framing import FRAME_NODE, read_frames
 
-SERVER = "http://127.0.0.1:5000/infer"
+SERVER = TRANSPORT["url"]
+STREAM_SERVER = SERVER + "/stream"
 
 
 def generate_nonce() -> str:
@@ -40,58 +47,29 @@ def build_wrapped_payload(context_bytes: bytes, ciphertext_bytes: bytes) -> byte
     """
     ctx_b64 = base64.b64encode(context_bytes)
     ct_b64 = base64.b64encode(ciphertext_bytes)
-    payload_bytes = b"TS_CTX::" + ctx_b64 + b"::TS_CT::" + ct_b64
-    return payload_bytes
+
+    # One allocation and copy, instead of chaining '+' (each of which would
+    # copy the multi-MB context again)
+    return b"".join((b"TS_CTX::", ctx_b64, b"::TS_CT::", ct_b64))
 
 
 def send_encrypted_request(vector):
     # 1) Create client TenSEAL context (with secret key)
     ctx = create_context_with_secret()
 
-    # 2) Serialize public context (for server)
-    public_ctx_bytes = serialize_public_context(ctx)
-
-    # 3) Encrypt input vector and serialize ciphertext
-    fhe_ct_bytes = encrypt_vector_and_serialize(ctx, vector)
-
-    # 4) Build payload (concat + AES-GCM wrap)
-    payload_bytes = build_wrapped_payload(public_ctx_bytes, fhe_ct_bytes)
-    iv_b64, ct_b64 = encrypt_payload(payload_bytes)
-
-    json_data = {
-        "nonce": generate_nonce(),
-        "timestamp": time.time(),
-        "payload": {
-            "iv": iv_b64,
-            "ct": ct_b64,
-        }
-        # fhe_context / ciphertext are not sent separately; they are inside payload_bytes
-    }
+    # 2-4) Encrypt input vector, wrap it with the public context (AES-GCM)
+    #      and build the request JSON (nonce, timestamp, payload)
+    json_data = build_request_json(ctx, vector)
 
-    # 5) Send to server
-    r = requests.post(SERVER, json=json_data, timeout=10)
-    print("STATUS:", r.status_code)
+    # 5) Send over the transport configured in shared/config.py TRANSPORT
+    #    (HTTP, Unix socket or in-process) and decode the result JSON
     try:
-        resp = r.json()
-    except Exception:
-        print("Non-JSON response:", r.text)
-        return
-    print("SERVER RESPONSE:", resp)
-
-    if r.status_code != 200:
+        out = post_request(json_data, transport=get_transport())
+    except RuntimeError as e:
+        print(e)
         return
 
     # 6) Decrypt and deserialize result
-    result_b64 = resp.get("result")
-    if not result_b64:
-        print("no result")
-        return
-
-    # Decode base64 → JSON string
-    result_bytes = base64.b64decode(result_b64)
-    import json
-    out = json.loads(result_bytes.decode("utf-8"))
-
     node_scores_hex = out.get("node_scores", [])
     if not node_scores_hex:
         print("no node_scores in response")
@@ -148,61 +126,218 @@ def send_encrypted_request(vector):
     predicted_class = int(leaf_outputs[best_leaf_idx])
     print("PREDICTED CLASS (leaf output):", predicted_class)
 
-def fhe_predict(features):
-    """
-    features: list without bias term, e.g. [5.1, 3.5, 1.4, 0.2]
-    Returns predicted class (int) using FHE pipeline.
+def generate_idempotency_key() -> str:
+    return uuid.uuid4().hex
+
+
+def build_request_json(ctx, vector, public_ctx_bytes=None, pool=None, idempotency_key=None) -> dict:
     """
-    # 1) Add bias and encrypt input
-    vector = list(features) + [1.0]
+    Encrypt 'vector' under ctx and build the JSON body expected by /infer.
 
-    ctx = create_context_with_secret()
-    public_ctx_bytes = serialize_public_context(ctx)
-    fhe_ct_bytes = encrypt_vector_and_serialize(ctx, vector)
+    public_ctx_bytes can be passed in when the same context is reused across
+    many requests, so the (large) public context is serialized only once.
+    pool is an optional EncryptionPool for ctx (see fhe_encrypt.py).
+    idempotency_key, if given, is bound to the payload as AES-GCM associated
+    data and lets the server answer retries from its result cache.
+    """
+    if public_ctx_bytes is None:
+        public_ctx_bytes = serialize_public_context(ctx)
+    fhe_ct_bytes = encrypt_vector_and_serialize(ctx, vector, pool=pool)
     payload_bytes = build_wrapped_payload(public_ctx_bytes, fhe_ct_bytes)
-    iv_b64, ct_b64 = encrypt_payload(payload_bytes)
+    aad = idempotency_key.encode("utf-8") if idempotency_key else None
+    iv_b64, ct_b64 = encrypt_payload(payload_bytes, aad)
 
     json_data = {
         "nonce": generate_nonce(),
         "timestamp": time.time(),
         "payload": {"iv": iv_b64, "ct": ct_b64},
     }
+    if idempotency_key:
+        json_data["idempotency_key"] = idempotency_key
+    return json_data
+
+
+def post_request(json_data: dict, server: str = None, timeout: float = 10, retries: int = 0,
+                 transport=None, endpoint: str = INFER) -> dict:
+    """
+    Send a request body to the server and return the decoded result JSON.
+
+    Uses 'transport' if given, else HTTP to 'server' if given, else the
+    transport configured in shared/config.py TRANSPORT. 'timeout' only
+    applies to the HTTP transport built for 'server'; other transports use
+    their own. 'endpoint' is relative to /infer (transport.INFER or
+    transport.MULTI).
+    On a timeout or connection error the same body is resent up to 'retries'
+    times with a fresh nonce/timestamp (the server rejects reused nonces).
+    """
+    if transport is None:
+        transport = HttpTransport(server, timeout) if server else get_transport()
+
+    for attempt in range(retries + 1):
+        try:
+            return transport.post(json_data, endpoint=endpoint)
+        except transport.retryable:
+            if attempt == retries:
+                raise
+            json_data = dict(json_data, nonce=generate_nonce(), timestamp=time.time())
+
+
+def _load_ckks_vector(ctx, ct_bytes: bytes):
+    """Deserialize a CKKSVector, supporting different TenSEAL versions."""
+    import tenseal as ts
+
+    if hasattr(ts, "ckks_vector_from"):
+        return ts.ckks_vector_from(ctx, ct_bytes)
+    return ts.CKKSVector.load(ctx, ct_bytes)
+
+
+class LazyNodeScores:
+    """
+    Node scores that are deserialized and decrypted only when read.
+
+    plaintext_traverse_from_scores only looks at the nodes on one
+    root-to-leaf path, so indexing this instead of a fully decrypted list
+    cuts client decryption from O(nodes) to O(depth). 'blobs' holds one
+    serialized ciphertext per node, as hex str (JSON response) or bytes
+    (stream frames), in a list or a dict keyed by node index.
+    """
+
+    def __init__(self, ctx, blobs):
+        self.ctx = ctx
+        self._blobs = blobs
+        self._scores = {}
 
-    # 2) Send request to server
-    r = requests.post(SERVER, json=json_data, timeout=10)
-    if r.status_code != 200:
-        raise RuntimeError(f"Server error: {r.status_code}, {r.text}")
+    def __len__(self):
+        return len(self._blobs)
 
-    resp = r.json()
-    result_b64 = resp.get("result")
-    if not result_b64:
-        raise RuntimeError("No result in server response")
+    def __getitem__(self, node):
+        score = self._scores.get(node)
+        if score is None:
+            blob = self._blobs[node]
+            if isinstance(blob, str):
+                blob = bytes.fromhex(blob)
+            score = self._scores[node] = _load_ckks_vector(self.ctx, blob).decrypt()[0]
+        return score
 
-    # 3) Decode JSON with node_scores (ignore path_costs for prediction)
-    result_bytes = base64.b64decode(result_b64)
-    import json
-    out = json.loads(result_bytes.decode("utf-8"))
+    @property
+    def num_decrypted(self) -> int:
+        return len(self._scores)
 
+
+def lazy_node_scores(ctx, out: dict) -> LazyNodeScores:
+    """LazyNodeScores over the node scores of a decoded server result."""
     node_scores_hex = out.get("node_scores", [])
     if not node_scores_hex:
         raise RuntimeError("Missing node_scores in response")
+    return LazyNodeScores(ctx, node_scores_hex)
 
-    import tenseal as ts
 
-    # 4) Decrypt all node scores
-    scores = []
-    for h in node_scores_hex:
-        ct_b = bytes.fromhex(h)
-        if hasattr(ts, "ckks_vector_from"):
-            v = ts.ckks_vector_from(ctx, ct_b)
-        else:
-            v = ts.CKKSVector.load(ctx, ct_b)
-        scores.append(v.decrypt()[0])
+def _prepare_request(features, ctx=None, pool=None):
+    """
+    Add the bias term and build the request body for 'features'.
+    Without an explicit ctx, the process-wide persistent context is used.
+    Returns (ctx, json_data).
+    """
+    vector = list(features) + [1.0]
+
+    if ctx is None:
+        ctx = get_persistent_context()
+        public_ctx_bytes = get_persistent_public_context_bytes()
+    else:
+        public_ctx_bytes = None
+    json_data = build_request_json(
+        ctx, vector, public_ctx_bytes=public_ctx_bytes, pool=pool,
+        idempotency_key=generate_idempotency_key(),
+    )
+    return ctx, json_data
+
+
+def fhe_predict(features, ctx=None, server: str = None, pool=None, retries: int = 2, transport=None):
+    """
+    features: list without bias term, e.g. [5.1, 3.5, 1.4, 0.2]
+    Returns predicted class (int) using FHE pipeline.
+
+    ctx defaults to the persistent client context; pool is an optional
+    EncryptionPool for that context (fhe_encrypt.get_encryption_pool).
+    The request goes through 'transport', HTTP to 'server', or the
+    configured transport (see post_request).
+    Timed-out requests are retried with the same idempotency key, so the
+    server does not evaluate them again.
+    """
+    # 1) Add bias and encrypt input
+    ctx, json_data = _prepare_request(features, ctx, pool)
+
+    # 2) Send request to server, decode JSON with node_scores
+    #    (path_costs are ignored for prediction)
+    out = post_request(json_data, server=server, retries=retries, transport=transport)
 
-    # 5) Traverse tree in plaintext using scores
+    # 3) Node scores are decrypted on demand, only along the traversed path
+    scores = lazy_node_scores(ctx, out)
+
+    # 4) Traverse tree in plaintext using scores
     predicted_class = plaintext_traverse_from_scores(scores)
     return predicted_class
 
+
+def fhe_predict_multi(features, model_ids, ctx=None, server: str = None, pool=None,
+                      retries: int = 2, transport=None) -> dict:
+    """
+    Score one feature vector against several models (ids of trees under
+    server/model/, see fhe_logic.model_path) with a single /infer/multi
+    request: the context and ciphertext are sent and deserialized once.
+
+    'server' is the /infer URL; other arguments as for fhe_predict.
+    Returns {model_id: predicted class}.
+    """
+    ctx, json_data = _prepare_request(features, ctx, pool)
+    json_data["models"] = list(model_ids)
+
+    out = post_request(json_data, server=server, retries=retries, transport=transport,
+                       endpoint=MULTI)
+
+    results = out.get("models", {})
+    predictions = {}
+    for model_id in model_ids:
+        if model_id not in results:
+            raise RuntimeError(f"Missing result for model {model_id!r} in response")
+        scores = lazy_node_scores(ctx, results[model_id])
+        predictions[model_id] = plaintext_traverse_from_scores(scores, model_id)
+    return predictions
+
+def iter_stream_frames(json_data: dict, server: str = STREAM_SERVER, timeout: float = 10):
+    """
+    POST to the streaming endpoint and yield (kind, index, payload) frames as
+    they arrive. The connection is closed when the caller stops iterating.
+    """
+    r = requests.post(server, json=json_data, timeout=timeout, stream=True)
+    try:
+        if r.status_code != 200:
+            raise RuntimeError(f"Server error: {r.status_code}, {r.text}")
+        r.raw.decode_content = True
+        yield from read_frames(r.raw)
+    finally:
+        r.close()
+
+
+def fhe_predict_stream(features, ctx=None, server: str = STREAM_SERVER, pool=None):
+    """
+    Like fhe_predict, but reads the result from /infer/stream without any
+    hex/base64 decoding. Path-cost frames are not needed for prediction, so
+    the stream is dropped once they start; only the node scores on the
+    traversed path are then decrypted.
+    """
+    ctx, json_data = _prepare_request(features, ctx, pool)
+
+    blobs = {}
+    for kind, index, blob in iter_stream_frames(json_data, server=server):
+        if kind != FRAME_NODE:
+            break
+        blobs[index] = blob
+
+    if not blobs:
+        raise RuntimeError("Missing node_scores in response")
+    return plaintext_traverse_from_scores(LazyNodeScores(ctx, blobs))
+
 if __name__ == "__main__":
     # Example: 4 features + bias
     sample = [5.1, 3.5, 1.4, 0.2, 1.0]
@@ -1,7 +1,16 @@
 # client/fhe_encrypt.py
+import queue
+import threading
+
 import tenseal as ts
 from shared.config import FHE_PARAMS
 
+_persistent_ctx = None
+_persistent_public_bytes = None
+_persistent_pools = {}
+_persistent_lock = threading.Lock()
+
+
 def create_context_with_secret():
     """
     Create TenSEAL context with secret key (client-side).
@@ -19,15 +28,104 @@ def create_context_with_secret():
     # secret key is present in this context (client must keep it)
     return ctx
 
+
+def get_persistent_context():
+    """
+    Process-wide client context, created on first use and reused afterwards,
+    so key generation is paid once instead of per prediction.
+    """
+    global _persistent_ctx
+    with _persistent_lock:
+        if _persistent_ctx is None:
+            _persistent_ctx = create_context_with_secret()
+    return _persistent_ctx
+
+
+def get_persistent_public_context_bytes() -> bytes:
+    """Serialized public part of get_persistent_context(), cached."""
+    global _persistent_public_bytes
+    ctx = get_persistent_context()
+    with _persistent_lock:
+        if _persistent_public_bytes is None:
+            _persistent_public_bytes = serialize_public_context(ctx)
+    return _persistent_public_bytes
+
+
 def serialize_public_context(ctx) -> bytes:
     """
     Serialize context without secret key so it can be loaded on server.
     """
     return ctx.serialize(save_secret_key=False)
 
-def encrypt_vector_and_serialize(ctx, vector):
+
+class EncryptionPool:
+    """
+    Offline/online split for encryption.
+
+    A background thread keeps up to 'max_size' fresh encryptions of the zero
+    vector ready. Online, encrypt() takes one and adds the plaintext to it,
+    which only costs an encode + add instead of sampling randomness and doing
+    public-key operations. Each zero encryption is used exactly once. When the
+    pool is empty, encrypt() falls back to a regular ts.ckks_vector.
+    """
+
+    def __init__(self, ctx, vector_size: int, max_size: int = 64):
+        self.ctx = ctx
+        self.vector_size = vector_size
+        self.hits = 0
+        self.misses = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._refill, name="fhe-encryption-pool", daemon=True)
+        self._thread.start()
+
+    def _refill(self):
+        zeros = [0.0] * self.vector_size
+        while not self._stop.is_set():
+            zero = ts.ckks_vector(self.ctx, zeros)
+            # Blocks while the pool is full; wakes up periodically to honour close()
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(zero, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+
+    def encrypt(self, vector):
+        """Encrypt 'vector' (length vector_size) into a CKKSVector."""
+        if len(vector) != self.vector_size:
+            raise ValueError(f"Expected vector of size {self.vector_size}, got {len(vector)}.")
+        try:
+            enc = self._queue.get_nowait()
+        except queue.Empty:
+            self.misses += 1
+            return ts.ckks_vector(self.ctx, list(vector))
+        self.hits += 1
+        enc += list(vector)  # plaintext add
+        return enc
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def get_encryption_pool(vector_size: int, max_size: int = 64) -> EncryptionPool:
+    """Process-wide EncryptionPool for get_persistent_context(), one per vector size."""
+    ctx = get_persistent_context()
+    with _persistent_lock:
+        pool = _persistent_pools.get(vector_size)
+        if pool is None:
+            pool = _persistent_pools[vector_size] = EncryptionPool(ctx, vector_size, max_size)
+    return pool
+
+
+def encrypt_vector_and_serialize(ctx, vector, pool=None):
     """
     Encrypt python list 'vector' into CKKS vector and return serialized bytes.
+    If an EncryptionPool for ctx is given, the online work is a plaintext add.
     """
-    v = ts.ckks_vector(ctx, vector)
-    return v.serialize()
\ No newline at end of file
+    if pool is not None:
+        v = pool.encrypt(vector)
+    else:
+        v = ts.ckks_vector(ctx, vector)
+    return v.serialize()
@@ -0,0 +1,208 @@
+# client/loadgen.py
+"""
+Open-loop load generator for /infer.
+
+Pre-encrypts a pool of request bodies with the regular client code, then fires
+them at a target arrival rate (constant or Poisson) regardless of how fast the
+server answers. Latency is measured from each request's *scheduled* send time,
+so client-side queueing under overload is counted (no coordinated omission).
+
+Sweeps a list of offered rates and reports throughput, error rate and latency
+percentiles per rate, plus the saturation point: the first rate at which
+goodput falls below --saturation-ratio of the offered rate, the error rate
+exceeds --max-error-rate, or p99 exceeds --slo-ms.
+
+Usage (from project root):
+  python -m client.loadgen --rates 1,2,4,8 --duration 20
+  python -m client.loadgen --start-server --server-workers 4 --arrival poisson
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from client.client import SERVER, build_request_json, generate_nonce
+from client.data_utils import load_iris_test_split
+from client.fhe_encrypt import create_context_with_secret, serialize_public_context
+
+_session = threading.local()
+
+
+def build_payload_pool(size: int) -> list:
+    """Encrypt 'size' request bodies (test-set rows) under one client context."""
+    X_test, _ = load_iris_test_split()
+    ctx = create_context_with_secret()
+    public_ctx_bytes = serialize_public_context(ctx)
+    return [
+        build_request_json(ctx, list(X_test[i % len(X_test)].astype(float)) + [1.0],
+                           public_ctx_bytes=public_ctx_bytes)
+        for i in range(size)
+    ]
+
+
+def start_local_server(url: str, workers: int, wait_s: float = 60.0):
+    """Start server/serve_prefork.py for 'url' and wait until it accepts connections."""
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_ROOT, "server", "serve_prefork.py"),
+         "--host", host, "--port", str(port), "--workers", str(workers)],
+    )
+    deadline = time.monotonic() + wait_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited early with code {proc.returncode}")
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"Server did not start listening on {host}:{port} within {wait_s} s")
+
+
+def _fire(url: str, body: dict, scheduled: float, timeout: float):
+    """Send one request; returns (scheduled, latency_s, ok, status)."""
+    if not hasattr(_session, "s"):
+        _session.s = requests.Session()
+    # Fresh nonce/timestamp per send: the server rejects replayed nonces
+    body = dict(body, nonce=generate_nonce(), timestamp=time.time())
+    try:
+        r = _session.s.post(url, json=body, timeout=timeout,
+                            headers={"X-Client-Id": "loadgen"})
+        status = r.status_code
+    except requests.RequestException:
+        status = None
+    return scheduled, time.monotonic() - scheduled, status == 200, status
+
+
+def run_rate(url: str, pool: list, rate: float, duration: float, arrival: str = "constant",
+             timeout: float = 30, max_outstanding: int = 256, seed: int = 0) -> dict:
+    """Offer 'rate' requests/s for 'duration' seconds and summarize the results."""
+    rng = random.Random(seed)
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_outstanding) as executor:
+        start = time.monotonic()
+        t = 0.0
+        i = 0
+        while t < duration:
+            scheduled = start + t
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(_fire, url, pool[i % len(pool)], scheduled, timeout))
+            i += 1
+            t += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+        results = [f.result() for f in futures]
+        elapsed = time.monotonic() - start
+
+    latencies = np.array([lat for _, lat, ok, _ in results if ok])
+    n_ok = len(latencies)
+    statuses = {}
+    for _, _, ok, status in results:
+        if not ok:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    def pct(q):
+        return float(np.percentile(latencies, q) * 1000) if n_ok else float("nan")
+
+    return {
+        "offered_rps": rate,
+        "sent": len(results),
+        "throughput_rps": n_ok / elapsed if elapsed > 0 else 0.0,
+        "error_rate": 1 - n_ok / len(results) if results else 0.0,
+        "errors_by_status": statuses,
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "max_ms": float(latencies.max() * 1000) if n_ok else float("nan"),
+    }
+
+
+def is_saturated(r: dict, saturation_ratio: float, max_error_rate: float, slo_ms: float = None) -> bool:
+    if r["throughput_rps"] < saturation_ratio * r["offered_rps"]:
+        return True
+    if r["error_rate"] > max_error_rate:
+        return True
+    return slo_ms is not None and r["p99_ms"] > slo_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test for the FHE /infer endpoint.")
+    parser.add_argument("--url", default=SERVER)
+    parser.add_argument("--rates", default="1,2,4,8,16",
+                        help="comma-separated offered rates (requests/s) to sweep")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per rate")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant")
+    parser.add_argument("--pool-size", type=int, default=32,
+                        help="number of distinct pre-encrypted payloads")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--max-outstanding", type=int, default=256)
+    parser.add_argument("--saturation-ratio", type=float, default=0.9)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--slo-ms", type=float, default=None, help="p99 latency objective")
+    parser.add_argument("--stop-at-saturation", action="store_true")
+    parser.add_argument("--start-server", action="store_true",
+                        help="start server/serve_prefork.py for --url")
+    parser.add_argument("--server-workers", type=int, default=2)
+    parser.add_argument("--json", help="write per-rate results to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rates = [float(r) for r in args.rates.split(",")]
+
+    proc = start_local_server(args.url, args.server_workers) if args.start_server else None
+    try:
+        print(f"Pre-encrypting {args.pool_size} payloads...")
+        pool = build_payload_pool(args.pool_size)
+
+        print(f"\n{'offered':>8} {'tput':>8} {'err%':>6} {'p50 ms':>9} {'p90 ms':>9} "
+              f"{'p99 ms':>9} {'max ms':>9}")
+        results = []
+        saturation = None
+        for rate in rates:
+            r = run_rate(args.url, pool, rate, args.duration, arrival=args.arrival,
+                         timeout=args.timeout, max_outstanding=args.max_outstanding,
+                         seed=args.seed)
+            results.append(r)
+            print(f"{r['offered_rps']:>8.2f} {r['throughput_rps']:>8.2f} "
+                  f"{r['error_rate'] * 100:>6.1f} {r['p50_ms']:>9.1f} {r['p90_ms']:>9.1f} "
+                  f"{r['p99_ms']:>9.1f} {r['max_ms']:>9.1f}")
+            if saturation is None and is_saturated(r, args.saturation_ratio,
+                                                   args.max_error_rate, args.slo_ms):
+                saturation = rate
+                if args.stop_at_saturation:
+                    break
+
+        if saturation is None:
+            print("\nNo saturation observed up to", rates[-1], "req/s")
+        else:
+            print(f"\nSaturation at offered load {saturation} req/s")
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"arrival": args.arrival, "saturation_rps": saturation,
+                           "results": results}, f, indent=2)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
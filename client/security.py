@@ -4,7 +4,8 @@ from shared.config import AES_KEY
 
 aesgcm = AESGCM(AES_KEY)
 
-def encrypt_payload(data_bytes):
+def encrypt_payload(data_bytes, aad=None):
+    # aad (e.g. the idempotency key) is authenticated but not encrypted
     iv = os.urandom(12)
-    ct = aesgcm.encrypt(iv, data_bytes, None)
+    ct = aesgcm.encrypt(iv, data_bytes, aad)
     return base64.b64encode(iv).decode(), base64.b64encode(ct).decode()
@@ -0,0 +1,161 @@
+# client/transport.py
+"""
+Pluggable transports for sending /infer requests.
+
+All transports take the request JSON built by client.build_request_json and
+return the decoded result JSON ({"node_scores": [...], "path_costs": [...]}),
+raising RuntimeError on a non-200 answer (ServerBusy for 429/503, which
+the server sends under load). post(..., endpoint=MULTI) targets
+/infer/multi instead (result: {"models": {model_id: {...}}}).
+
+  HttpTransport       requests -> TCP -> Flask (the default)
+  UnixSocketTransport HTTP over a Unix domain socket (server.py --uds PATH)
+  InProcessTransport  calls server.handle_infer directly: same AES unwrap,
+                      replay check, admission and evaluation, but no socket,
+                      HTTP or JSON encoding of the request and result
+
+get_transport() builds the one selected in shared/config.py TRANSPORT.
+"""
+
+import abc
+import base64
+import http.client
+import json
+import os
+import socket
+import sys
+
+import requests
+
+from shared.config import TRANSPORT
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Endpoints, relative to /infer
+INFER = ""
+MULTI = "/multi"
+
+
+class ServerBusy(RuntimeError):
+    """429/503 from admission control; retry_after is the Retry-After header in seconds."""
+
+    def __init__(self, status: int, text: str, retry_after: float = None):
+        super().__init__(f"Server busy: {status}, {text}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _retry_after(headers) -> float:
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _decode_result(status: int, resp: dict, text: str, headers=None) -> dict:
+    if status in (429, 503):
+        raise ServerBusy(status, text, _retry_after(headers or {}))
+    if status != 200:
+        raise RuntimeError(f"Server error: {status}, {text}")
+    result = resp.get("result")
+    if not result:
+        raise RuntimeError("No result in server response")
+    if isinstance(result, str):
+        result = base64.b64decode(result)
+    return json.loads(result.decode("utf-8"))
+
+
+class Transport(abc.ABC):
+    # Exceptions after which a request may be resent (see client.post_request)
+    retryable = ()
+
+    @abc.abstractmethod
+    def post(self, json_data: dict, headers: dict = None, endpoint: str = INFER) -> dict:
+        """Send one request to 'endpoint' and return the decoded result JSON."""
+
+
+class HttpTransport(Transport):
+    retryable = (requests.Timeout, requests.ConnectionError)
+
+    def __init__(self, url: str = TRANSPORT["url"], timeout: float = TRANSPORT["timeout"]):
+        self.url = url
+        self.timeout = timeout
+
+    def post(self, json_data, headers=None, endpoint=INFER):
+        r = requests.post(self.url + endpoint, json=json_data, headers=headers, timeout=self.timeout)
+        try:
+            resp = r.json()
+        except ValueError:
+            resp = {}
+        return _decode_result(r.status_code, resp, r.text, r.headers)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class UnixSocketTransport(Transport):
+    retryable = (socket.timeout, ConnectionError, FileNotFoundError)
+
+    def __init__(self, path: str = TRANSPORT["uds_path"], timeout: float = TRANSPORT["timeout"],
+                 route: str = "/infer"):
+        self.path = path
+        self.timeout = timeout
+        self.route = route
+
+    def post(self, json_data, headers=None, endpoint=INFER):
+        body = json.dumps(json_data).encode("utf-8")
+        conn = _UnixHTTPConnection(self.path, self.timeout)
+        try:
+            conn.request("POST", self.route + endpoint, body=body,
+                         headers={"Content-Type": "application/json", **(headers or {})})
+            r = conn.getresponse()
+            text = r.read().decode("utf-8", "replace")
+            response_headers = dict(r.getheaders())
+        finally:
+            conn.close()
+        try:
+            resp = json.loads(text)
+        except ValueError:
+            resp = {}
+        return _decode_result(r.status, resp, text, response_headers)
+
+
+class InProcessTransport(Transport):
+    def __init__(self, client_id: str = "inprocess"):
+        # Server modules are imported as top-level names (run from server/)
+        server_dir = os.path.join(PROJECT_ROOT, "server")
+        if server_dir not in sys.path:
+            sys.path.insert(0, server_dir)
+        import server as server_app
+
+        self._handlers = {INFER: server_app.handle_infer, MULTI: server_app.handle_infer_multi}
+        self.client_id = client_id
+
+    def post(self, json_data, headers=None, endpoint=INFER):
+        payload = json_data.get("payload") or {}
+        # The request is never serialized; its size is dominated by the AES payload
+        size = len(payload.get("ct", "")) + len(payload.get("iv", ""))
+        body, status, response_headers = self._handlers[endpoint](
+            lambda: json_data, headers or {}, self.client_id, size, encode_result=False,
+        )
+        return _decode_result(status, body, json.dumps(body) if status != 200 else "", response_headers)
+
+
+def get_transport(kind: str = None) -> Transport:
+    """Transport selected by 'kind' or shared/config.py TRANSPORT["kind"]."""
+    kind = kind or TRANSPORT["kind"]
+    if kind == "http":
+        return HttpTransport()
+    if kind == "uds":
+        return UnixSocketTransport()
+    if kind == "inprocess":
+        return InProcessTransport()
+    raise ValueError(f"Unknown transport: {kind!r} (expected http, uds or inprocess)")
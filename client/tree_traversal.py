@@ -2,22 +2,42 @@
 import os
 import numpy as np
 
-# Load tree structure once
 _project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-_tree_path = os.path.join(_project_root, "server", "model", "tree_matrices.npy")
-_tree = np.load(_tree_path, allow_pickle=True).item()
+_model_dir = os.path.join(_project_root, "server", "model")
+_trees = {}
 
-children_left = _tree["children_left"]
-children_right = _tree["children_right"]
-leaf_values = _tree["leaf_values"]      # value per node index
-classes = _tree["classes"]              # optional, for labels if needed
+# Same ids as server/fhe_logic.py: "default" is the tree in server/model/,
+# any other id the one in server/model/<model_id>/
+DEFAULT_MODEL_ID = "default"
 
-def plaintext_traverse_from_scores(scores):
+
+def load_tree(model_id: str = DEFAULT_MODEL_ID):
+    """
+    Load tree structure once (on first use, not at import time).
+    Keys used here: children_left, children_right, leaf_values (value per
+    node index) and classes (optional, for labels if needed).
+    """
+    tree = _trees.get(model_id)
+    if tree is None:
+        if model_id == DEFAULT_MODEL_ID:
+            path = os.path.join(_model_dir, "tree_matrices.npy")
+        else:
+            path = os.path.join(_model_dir, model_id, "tree_matrices.npy")
+        tree = _trees[model_id] = np.load(path, allow_pickle=True).item()
+    return tree
+
+
+def plaintext_traverse_from_scores(scores, model_id: str = DEFAULT_MODEL_ID):
     """
     Simulate scikit-learn's tree traversal but using node scores.
     scores[i] ≈ x[feature_i] - threshold_i for node i.
     Returns predicted class (int).
     """
+    tree = load_tree(model_id)
+    children_left = tree["children_left"]
+    children_right = tree["children_right"]
+    leaf_values = tree["leaf_values"]
+
     node = 0
     while True:
         left = children_left[node]
@@ -0,0 +1,243 @@
+# server/admission.py
+"""
+Memory-aware admission control with per-client fair scheduling.
+
+Each request is assigned an estimated memory footprint (from payload size and
+model size) and CPU cost (number of homomorphic operations). A request is
+admitted only when the global memory budget and the concurrency cap allow it.
+Waiting requests are queued per client identity and served by deficit
+round-robin over CPU cost, so a client sending many or large requests cannot
+starve the others:
+
+  - each client gets `weight` shares of CPU per round,
+  - a client may queue at most `max_queued_per_client` requests (429 beyond),
+  - a request waits at most `queue_timeout_s` for admission (503 after),
+  - a request whose estimate exceeds the whole budget is rejected (413).
+
+A client whose next request does not fit in the free memory is skipped, so
+it does not hold up clients whose requests fit. Memory released from then
+on is reserved for that request (in the order requests got blocked) until
+it fits, so smaller requests cannot starve it.
+
+Client identities are whatever the caller passes in; the server uses the
+self-declared X-Client-Id header (see server._client_id). A client can
+therefore spread requests over many ids to get more queue slots and
+round-robin turns. The global limits (memory budget, concurrency cap,
+queue timeout) still bound the total load; set ADMISSION["client_id_header"]
+to None to key clients on their peer address instead.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from shared.config import FHE_PARAMS
+
+# Copies of the request payload alive at once while unwrapping it: JSON text,
+# AES ciphertext, decrypted plaintext, decoded context/ciphertext and the
+# deserialized TenSEAL context (which is larger than its serialized form).
+_PAYLOAD_COPIES = 6
+# Per output ciphertext: the live CKKSVector plus, for the non-streaming
+# response, serialized bytes, hex (2x) and base64 JSON (~1.33x of hex).
+_LIVE_COPIES = 1
+_ENCODED_COPIES = 1 + 2 + 2.7
+
+
+def ciphertext_size_estimate() -> int:
+    """Upper bound on one serialized CKKS ciphertext for FHE_PARAMS."""
+    n = FHE_PARAMS["poly_modulus_degree"]
+    levels = len(FHE_PARAMS["coeff_mod_bit_sizes"]) - 1
+    return 2 * n * levels * 8
+
+
+def estimate_cost(payload_bytes: int, stats: dict, streaming: bool = False):
+    """
+    Estimate (memory_bytes, cpu_ops) for one request against a model.
+
+    stats is fhe_logic.model_stats(): num_nodes, num_leaves, path_terms.
+    """
+    outputs = stats["num_nodes"] + stats["num_leaves"]
+    per_output = _LIVE_COPIES + (0 if streaming else _ENCODED_COPIES)
+    mem = _PAYLOAD_COPIES * payload_bytes + int(outputs * ciphertext_size_estimate() * per_output)
+    cpu = stats["num_nodes"] + stats["path_terms"]
+    return mem, cpu
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; carries the HTTP status to return."""
+
+    def __init__(self, status: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class _Ticket:
+    __slots__ = ("client_id", "mem", "cpu", "granted", "released", "reserved")
+
+    def __init__(self, client_id, mem, cpu):
+        self.client_id = client_id
+        self.mem = mem
+        self.cpu = cpu
+        self.granted = False
+        self.released = False
+        self.reserved = 0       # memory held for this ticket while it is blocked
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        memory_budget_bytes: int,
+        max_concurrent: int,
+        max_queued_per_client: int,
+        queue_timeout_s: float,
+        client_weights: dict = None,
+    ):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_concurrent = max_concurrent
+        self.max_queued_per_client = max_queued_per_client
+        self.queue_timeout_s = queue_timeout_s
+        self.client_weights = dict(client_weights or {})
+
+        self._cond = threading.Condition()
+        self._queues = {}       # client_id -> deque of waiting tickets
+        self._deficit = {}      # client_id -> unused CPU credit this round
+        self._active = deque()  # round-robin order of clients with waiting tickets
+        self._blocked = []      # queue heads waiting for memory, oldest first
+        self._mem_in_use = 0
+        self._mem_reserved = 0  # sum of reserved over self._blocked
+        self._running = 0
+
+    def acquire(self, client_id, mem: int, cpu: int) -> _Ticket:
+        """Block until the request is admitted; raise AdmissionRejected otherwise."""
+        if mem > self.memory_budget_bytes:
+            raise AdmissionRejected(413, "request too large for server memory budget")
+
+        with self._cond:
+            queue = self._queues.get(client_id)
+            if queue is None:
+                queue = self._queues[client_id] = deque()
+                self._deficit[client_id] = 0
+                self._active.append(client_id)
+            if len(queue) >= self.max_queued_per_client:
+                raise AdmissionRejected(429, "too many queued requests for this client")
+
+            ticket = _Ticket(client_id, mem, cpu)
+            queue.append(ticket)
+            self._dispatch()
+
+            deadline = time.monotonic() + self.queue_timeout_s
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    queue.remove(ticket)
+                    if not queue:
+                        self._drop_client(client_id)
+                    if ticket in self._blocked:
+                        self._unblock(ticket)
+                    # A blocked head may have been removed; let others through
+                    self._dispatch()
+                    raise AdmissionRejected(503, "server overloaded; timed out waiting for admission")
+                self._cond.wait(remaining)
+        return ticket
+
+    def release(self, ticket: _Ticket):
+        """Return a ticket's resources. Safe to call more than once."""
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._mem_in_use -= ticket.mem
+            self._running -= 1
+            self._reserve_freed_memory()
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, client_id, mem: int, cpu: int):
+        ticket = self.acquire(client_id, mem, cpu)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def snapshot(self) -> dict:
+        """Current usage, for logging/monitoring."""
+        with self._cond:
+            return {
+                "mem_in_use": self._mem_in_use,
+                "mem_reserved": self._mem_reserved,
+                "running": self._running,
+                "queued": {c: len(q) for c, q in self._queues.items()},
+            }
+
+    # -----------------------------------------------------------------
+    # Scheduling (caller holds self._cond)
+    # -----------------------------------------------------------------
+
+    def _drop_client(self, client_id):
+        del self._queues[client_id]
+        del self._deficit[client_id]
+        self._active.remove(client_id)
+
+    def _unblock(self, ticket: _Ticket):
+        self._blocked.remove(ticket)
+        self._mem_reserved -= ticket.reserved
+        ticket.reserved = 0
+
+    def _reserve_freed_memory(self):
+        """Hand unreserved free memory to blocked heads, oldest first."""
+        free = self.memory_budget_bytes - self._mem_in_use - self._mem_reserved
+        for ticket in self._blocked:
+            if free <= 0:
+                break
+            extra = min(ticket.mem - ticket.reserved, free)
+            ticket.reserved += extra
+            self._mem_reserved += extra
+            free -= extra
+
+    def _dispatch(self):
+        granted = False
+        skipped = set()   # clients whose head does not fit in memory right now
+        while len(skipped) < len(self._active) and self._running < self.max_concurrent:
+            client_id = self._active[0]
+            if client_id in skipped:
+                self._active.rotate(-1)
+                continue
+            queue = self._queues[client_id]
+            ticket = queue[0]
+
+            if self._deficit[client_id] < ticket.cpu:
+                # Out of credit: top up by one quantum and move to the back.
+                # The quantum is the largest waiting head cost, so a weight-1
+                # client gets at least one request per round.
+                quantum = max(self._queues[c][0].cpu for c in self._active)
+                weight = self.client_weights.get(client_id, 1)
+                self._deficit[client_id] += max(quantum * weight, 1)
+                self._active.rotate(-1)
+                continue
+
+            # The head may use its own reservation plus unreserved free memory
+            free = self.memory_budget_bytes - self._mem_in_use - self._mem_reserved
+            if ticket.mem - ticket.reserved > free:
+                # Skip only this client; it keeps its credit, and memory
+                # released from now on is reserved for this request
+                if ticket not in self._blocked:
+                    self._blocked.append(ticket)
+                skipped.add(client_id)
+                self._active.rotate(-1)
+                continue
+
+            if ticket in self._blocked:
+                self._unblock(ticket)
+            queue.popleft()
+            ticket.granted = True
+            granted = True
+            self._mem_in_use += ticket.mem
+            self._running += 1
+            self._deficit[client_id] -= ticket.cpu
+            if not queue:
+                self._drop_client(client_id)
+
+        if granted:
+            self._cond.notify_all()
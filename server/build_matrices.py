@@ -3,7 +3,7 @@ import numpy as np
 
 # build_matrices.py
 
-def build_decision_matrices(tree_data):
+def build_decision_matrices(tree_data, verbose=True):
     """Convert extracted tree → FHE-ready matrices (as in paper)"""
     thresholds = tree_data['thresholds']
     features = tree_data['features']
@@ -15,7 +15,8 @@ def build_decision_matrices(tree_data):
     num_nodes = len(thresholds)
     n_features = tree_data['n_features']
 
-    print(f"🔨 Building matrices for {num_nodes} nodes, {n_features} features...")
+    if verbose:
+        print(f"🔨 Building matrices for {num_nodes} nodes, {n_features} features...")
 
     # 1. DECISION MATRIX
     decision_matrix = np.zeros((num_nodes, n_features + 1))
@@ -76,13 +77,14 @@ def build_decision_matrices(tree_data):
     # 3. LEAF OUTPUT VECTOR
     leaf_output_vector = np.array([leaf_values[leaf_idx] for leaf_idx in leaf_indices])
 
-    print("✅ Decision matrices built!")
-    print(f"   Decision nodes: {num_decision_nodes}/{num_nodes}")
-    print(f"   Decision matrix shape: {decision_matrix.shape}")
-    print(f"   Path-cost matrix shape: {path_cost_matrix.shape}")
-    print(f"   Leaf output vector shape: {leaf_output_vector.shape}")
-    print(f"   Sample decision row: {decision_matrix[0]}")
-    print(f"   Sample leaf outputs: {leaf_output_vector[:5]}")
+    if verbose:
+        print("✅ Decision matrices built!")
+        print(f"   Decision nodes: {num_decision_nodes}/{num_nodes}")
+        print(f"   Decision matrix shape: {decision_matrix.shape}")
+        print(f"   Path-cost matrix shape: {path_cost_matrix.shape}")
+        print(f"   Leaf output vector shape: {leaf_output_vector.shape}")
+        print(f"   Sample decision row: {decision_matrix[0]}")
+        print(f"   Sample leaf outputs: {leaf_output_vector[:5]}")
 
     return {
         'decision_matrix': decision_matrix,
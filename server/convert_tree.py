@@ -1,77 +1,111 @@
+import argparse
 import joblib
 import numpy as np
 import os
 
+from simplify_tree import simplify_tree, verify_equivalence
+
 # Get current directory (server/) and model path
 MODEL_PATH = os.path.join('model', 'dt_plain.joblib')
+X_TRAIN_PATH = os.path.join('model', 'X_train.npy')
+
+
+def extract_tree(clf):
+    """Extract the sklearn tree structure into plain numpy arrays."""
+    # Extract tree structure parameters
+    tree = clf.tree_
+
+    # Number of nodes
+    num_nodes = tree.node_count
+
+    # Extract thresholds: -2 means leaf node
+    thresholds = tree.threshold
+
+    # Extract left and right children indices (-1 leaves)
+    children_left = tree.children_left
+    children_right = tree.children_right
+
+    # Extract feature indices for split
+    features = tree.feature
+
+    # Extract leaf values (value attribute gives class counts)
+    leaf_values = []
+    leaf_indices = []
+    for i in range(num_nodes):
+        if children_left[i] == children_right[i]:  # leaf node
+            # Extract value vector for classification, take argmax for prediction
+            leaf_pred = np.argmax(tree.value[i][0])
+            leaf_values.append(leaf_pred)
+            leaf_indices.append(i)
+        else:
+            leaf_values.append(None)
+
+    # Convert to numpy arrays for easy matrix form conversion
+    return {
+        'thresholds': np.array(thresholds),
+        'features': np.array(features),
+        'children_left': np.array(children_left),
+        'children_right': np.array(children_right),
+        'leaf_values': np.array(leaf_values),
+        'leaf_indices': np.array(leaf_indices),
+        'num_nodes': num_nodes,
+        'n_features': clf.n_features_in_,
+        'classes': clf.classes_
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract the trained tree for FHE inference.")
+    parser.add_argument("--no-simplify", action="store_true",
+                        help="export the sklearn tree verbatim (skip the simplification pass)")
+    args = parser.parse_args()
+
+    # Load plaintext trained decision tree model
+    print("Loading trained decision tree...")
+    clf = joblib.load(MODEL_PATH)
+
+    tree_matrices = extract_tree(clf)
+    thresholds = tree_matrices['thresholds']
+    features = tree_matrices['features']
+    leaf_values = tree_matrices['leaf_values']
+    leaf_indices = tree_matrices['leaf_indices']
+
+    print(f"✅ Tree extraction complete!")
+    print(f"Number of nodes: {tree_matrices['num_nodes']}")
+    print(f"Number of leaf nodes: {len(leaf_indices)}")
+    print(f"Thresholds shape: {thresholds.shape}")
+    print(f"Features shape: {features.shape}")
+    print(f"Children left shape: {tree_matrices['children_left'].shape}")
+    print(f"Leaf values shape: {leaf_values.shape}")
+
+    # Shrink the encrypted circuit: collapse same-class subtrees and drop
+    # splits implied by ancestor thresholds, then check on the training data
+    if not args.no_simplify:
+        simplified, report = simplify_tree(tree_matrices)
+        X_train = np.load(X_TRAIN_PATH)
+        verify_equivalence(tree_matrices, simplified, X_train)
+        print(f"\n✂️  Simplified tree (predictions identical on {len(X_train)} training rows):")
+        print(f"   Nodes: {report['nodes_before']} -> {report['nodes_after']}")
+        print(f"   Leaves: {report['leaves_before']} -> {report['leaves_after']}")
+        print(f"   Dot products (dominant cost): {report['dots_before']} -> {report['dots_after']}")
+        print(f"   Path-cost terms (scalar multiply + add): "
+              f"{report['path_terms_before']} -> {report['path_terms_after']}")
+        tree_matrices = simplified
+
+    # Save extracted tree parameters for later use (Step 3+)
+    output_path = os.path.join('model', 'tree_matrices.npy')
+    np.save(output_path, tree_matrices)
+    print(f"💾 Saved tree matrices to: {output_path}")
+
+    # Quick verification
+    thresholds = tree_matrices['thresholds']
+    leaf_values = tree_matrices['leaf_values']
+    leaf_indices = tree_matrices['leaf_indices']
+    print("\n🔍 Sample data:")
+    print(f"First 5 thresholds: {thresholds[:5]}")
+    print(f"First 5 features: {tree_matrices['features'][:5]}")
+    print(f"Sample leaf values: {leaf_values[leaf_indices[:3]]}")
+
 
-# Load plaintext trained decision tree model
-print("Loading trained decision tree...")
-clf = joblib.load(MODEL_PATH)
-
-# Extract tree structure parameters
-tree = clf.tree_
-
-# Number of nodes
-num_nodes = tree.node_count
-
-# Extract thresholds: -2 means leaf node
-thresholds = tree.threshold
-
-# Extract left and right children indices (-1 leaves)
-children_left = tree.children_left
-children_right = tree.children_right
-
-# Extract feature indices for split
-features = tree.feature
-
-# Extract leaf values (value attribute gives class counts)
-leaf_values = []
-leaf_indices = []
-for i in range(num_nodes):
-    if children_left[i] == children_right[i]:  # leaf node
-        # Extract value vector for classification, take argmax for prediction
-        leaf_pred = np.argmax(tree.value[i][0])
-        leaf_values.append(leaf_pred)
-        leaf_indices.append(i)
-    else:
-        leaf_values.append(None)
-
-# Convert to numpy arrays for easy matrix form conversion
-thresholds = np.array(thresholds)
-children_left = np.array(children_left)
-children_right = np.array(children_right)
-features = np.array(features)
-leaf_values = np.array(leaf_values)
-leaf_indices = np.array(leaf_indices)
-
-print(f"✅ Tree extraction complete!")
-print(f"Number of nodes: {num_nodes}")
-print(f"Number of leaf nodes: {len(leaf_indices)}")
-print(f"Thresholds shape: {thresholds.shape}")
-print(f"Features shape: {features.shape}")
-print(f"Children left shape: {children_left.shape}")
-print(f"Leaf values shape: {leaf_values.shape}")
-
-# Save extracted tree parameters for later use (Step 3+)
-tree_matrices = {
-    'thresholds': thresholds,
-    'features': features,
-    'children_left': children_left,
-    'children_right': children_right,
-    'leaf_values': leaf_values,
-    'leaf_indices': leaf_indices,
-    'num_nodes': num_nodes,
-    'n_features': clf.n_features_in_,
-    'classes': clf.classes_
-}
-
-output_path = os.path.join('model', 'tree_matrices.npy')
-np.save(output_path, tree_matrices)
-print(f"💾 Saved tree matrices to: {output_path}")
-
-# Quick verification
-print("\n🔍 Sample data:")
-print(f"First 5 thresholds: {thresholds[:5]}")
-print(f"First 5 features: {features[:5]}")
-print(f"Sample leaf values: {leaf_values[leaf_indices[:3]]}")
+if __name__ == "__main__":
+    main()
@@ -10,30 +10,127 @@ Aligned with:
 
 import os
 import json
+import re
+import threading
 import numpy as np
 import tenseal as ts
 
 # ---------------------------------------------------------------------
-# Load FHE decision-tree matrices once
+# Model loading (explicit, lazy)
 # ---------------------------------------------------------------------
 
-_FHE_MATRICES_PATH = os.path.join("model", "fhe_matrices.npy")
-if not os.path.exists(_FHE_MATRICES_PATH):
-    raise FileNotFoundError(
-        f"Missing {_FHE_MATRICES_PATH}. "
-        "Run convert_tree.py and build_matrices.py first."
-    )
+_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+_FHE_MATRICES_PATH = os.path.join(_MODEL_DIR, "fhe_matrices.npy")
+
+# Model ids name additional trees under model/<model_id>/fhe_matrices.npy;
+# DEFAULT_MODEL_ID is the tree in model/ itself.
+DEFAULT_MODEL_ID = "default"
+_MODEL_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+_models = {}
+_model_lock = threading.Lock()
+
+
+def compile_model(fhe_mats: dict) -> dict:
+    """
+    Turn FHE matrices (from build_matrices.py) into the form used per request:
+    decision rows as plain Python lists (ready for CKKSVector.dot) and each
+    path-cost row as its non-zero (node_idx, weight) terms.
+    """
+    decision_matrix = fhe_mats["decision_matrix"]      # (num_nodes, n_features+1)
+    path_cost_matrix = fhe_mats["path_cost_matrix"]    # (num_leaves, num_nodes)
+    return {
+        "decision_matrix": decision_matrix,
+        "path_cost_matrix": path_cost_matrix,
+        "leaf_output_vector": fhe_mats["leaf_output_vector"],  # (num_leaves,)
+        "n_features": int(fhe_mats["n_features"]),             # without bias
+        "decision_rows": [row.tolist() for row in decision_matrix],
+        "path_terms": [
+            [(int(j), float(row[j])) for j in np.flatnonzero(row)]
+            for row in path_cost_matrix
+        ],
+    }
+
+
+def model_path(model_id: str = DEFAULT_MODEL_ID) -> str:
+    """Path of the FHE matrices for model_id (ValueError if the id is malformed)."""
+    if model_id == DEFAULT_MODEL_ID:
+        return _FHE_MATRICES_PATH
+    if not _MODEL_ID_RE.match(model_id) or model_id.startswith("."):
+        raise ValueError(f"Invalid model id: {model_id!r}")
+    return os.path.join(_MODEL_DIR, model_id, "fhe_matrices.npy")
+
+
+def model_exists(model_id: str) -> bool:
+    try:
+        return model_id in _models or os.path.exists(model_path(model_id))
+    except ValueError:
+        return False
+
 
-_fhe_mats = np.load(_FHE_MATRICES_PATH, allow_pickle=True).item()
-_DECISION_MATRIX = _fhe_mats["decision_matrix"]        # (num_nodes, n_features+1)
-_LEAF_OUTPUT_VECTOR = _fhe_mats["leaf_output_vector"]  # (num_leaves,)
-_PATH_COST_MATRIX = _fhe_mats["path_cost_matrix"]      # (num_leaves, num_nodes)  <-- NEW
-_N_FEATURES = int(_fhe_mats["n_features"])             # without bias
+def available_models() -> list:
+    """Ids of all models with FHE matrices on disk (default first)."""
+    ids = [DEFAULT_MODEL_ID] if os.path.exists(_FHE_MATRICES_PATH) else []
+    if os.path.isdir(_MODEL_DIR):
+        for name in sorted(os.listdir(_MODEL_DIR)):
+            if name != DEFAULT_MODEL_ID and model_exists(name):
+                ids.append(name)
+    return ids
+
+
+def load_model(model_id: str = DEFAULT_MODEL_ID, path: str = None) -> dict:
+    """
+    Load and compile the FHE matrices of one model once per process.
+
+    Called lazily on first use; servers should call it explicitly at startup
+    (before forking workers, see serve_prefork.py) so no request pays for it.
+    """
+    with _model_lock:
+        if model_id not in _models:
+            path = path or model_path(model_id)
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    f"Missing {path}. "
+                    "Run convert_tree.py and build_matrices.py first."
+                )
+            _models[model_id] = compile_model(np.load(path, allow_pickle=True).item())
+    return _models[model_id]
+
+
+def register_model(model_id: str, fhe_mats: dict) -> dict:
+    """Compile in-memory FHE matrices and serve them as model_id (replacing any loaded one)."""
+    model = compile_model(fhe_mats)
+    with _model_lock:
+        _models[model_id] = model
+    return model
+
+
+def load_all_models() -> list:
+    """Load every model found on disk; returns their ids."""
+    ids = available_models()
+    for model_id in ids:
+        load_model(model_id)
+    return ids
+
+
+def _get_model(model_id: str = DEFAULT_MODEL_ID) -> dict:
+    model = _models.get(model_id)
+    return model if model is not None else load_model(model_id)
 
 # ---------------------------------------------------------------------
 # Core functions (used by server.py)
 # ---------------------------------------------------------------------
 
+def model_stats(model_id: str = DEFAULT_MODEL_ID) -> dict:
+    """Size of the loaded model, used by the server for cost estimation."""
+    model = _get_model(model_id)
+    return {
+        "num_nodes": len(model["decision_rows"]),
+        "num_leaves": len(model["path_terms"]),
+        "path_terms": sum(len(terms) for terms in model["path_terms"]),
+    }
+
+
 def deserialize_context(context_bytes: bytes):
     """Load a TenSEAL context from serialized bytes."""
     if not context_bytes:
@@ -59,21 +156,7 @@ def _deserialize_ckks_vector(ctx, ct_bytes: bytes):
     raise ValueError("Could not deserialize CKKSVector from provided bytes.")
 
 
-def evaluate_decision_like(context_bytes: bytes, ct_bytes: bytes) -> bytes:
-    """
-    Server entry point.
-
-    Args:
-        context_bytes: serialized TenSEAL context (public).
-        ct_bytes: serialized CKKSVector encoding [x_0, ..., x_{d-1}, 1.0].
-
-    Returns:
-        JSON bytes:
-        {
-          "node_scores": [hex(serialized_score_0), ...],
-          "path_costs":  [hex(serialized_cost_leaf0), ...]   # NEW
-        }
-    """
+def _load_encrypted_input(context_bytes: bytes, ct_bytes: bytes, op_stats=None):
     if not context_bytes:
         raise ValueError("Missing TenSEAL context bytes; client must send serialized context.")
     if not ct_bytes:
@@ -84,35 +167,47 @@ def evaluate_decision_like(context_bytes: bytes, ct_bytes: bytes) -> bytes:
 
     # 2) Load encrypted input vector
     enc_input = _deserialize_ckks_vector(ctx, ct_bytes)
+    if op_stats is not None:
+        from profiling import ProfiledVector
+        enc_input = ProfiledVector(enc_input, op_stats)
+    return enc_input
+
+
+def _generate_model(enc_input, model: dict, score_cache: dict = None):
+    """
+    Yield ("node", i, bytes) then ("cost", leaf, bytes) for one model.
+
+    score_cache maps a decision row (as a tuple) to its encrypted score and
+    can be shared between models evaluated on the same input, so a split
+    that several trees have in common costs one dot product in total.
+    """
+    if score_cache is None:
+        score_cache = {}
 
     # 3) Homomorphic matrix-vector multiplication over decision matrix rows
     #    Compute encrypted node scores s_i = <row_i, x_padded>
     enc_scores = []
-    for i in range(_DECISION_MATRIX.shape[0]):
-        row = _DECISION_MATRIX[i, :].tolist()
-        score_i = enc_input.dot(row)     # homomorphic inner product
+    for i, row in enumerate(model["decision_rows"]):
+        key = tuple(row)
+        score_i = score_cache.get(key)
+        if score_i is None:
+            score_i = enc_input.dot(row)     # homomorphic inner product
+            score_cache[key] = score_i
         enc_scores.append(score_i)
+        yield "node", i, score_i.serialize()
 
-    # 4) Serialize each node score separately
-    serialized_scores = [s.serialize() for s in enc_scores]
-    node_scores_hex = [b.hex() for b in serialized_scores]
-
-    # 5) Homomorphic path-cost computation (leaf pruning)  <-- NEW
+    # 4) Homomorphic path-cost computation (leaf pruning)
     #    We conceptually want: path_costs = PATH_COST_MATRIX @ node_scores
     #    Each leaf ℓ gets: cost_ℓ = sum_j PATH_COST_MATRIX[ℓ,j] * s_j
-    enc_path_costs = []
-    num_leaves = _PATH_COST_MATRIX.shape[0]
-
-    for leaf_idx in range(num_leaves):
-        row = _PATH_COST_MATRIX[leaf_idx, :].tolist()
-        # Build a linear combination Σ_j w_j * s_j
+    for leaf_idx, terms in enumerate(model["path_terms"]):
+        # Build a linear combination Σ_j w_j * s_j over the non-zero terms
         # Because each s_j is itself a CKKS scalar vector, we:
-        #  - scale each s_j by w_j (w_j ∈ {-1, 0, 1} in our construction)
+        #  - scale each s_j by w_j (w_j ∈ {-1, 1} in our construction)
         #  - sum them up.
+        # The scalar multiply always yields a new ciphertext, so the in-place
+        # add never touches a (possibly shared) node score.
         acc = None
-        for node_idx, w in enumerate(row):
-            if w == 0.0:
-                continue
+        for node_idx, w in terms:
             term = enc_scores[node_idx] * w  # scalar multiply
             if acc is None:
                 acc = term
@@ -121,12 +216,54 @@ def evaluate_decision_like(context_bytes: bytes, ct_bytes: bytes) -> bytes:
         # If a leaf has no path nodes (should not happen), set cost 0
         if acc is None:
             acc = enc_scores[0] * 0.0
-        enc_path_costs.append(acc)
+        yield "cost", leaf_idx, acc.serialize()
+
 
-    serialized_costs = [c.serialize() for c in enc_path_costs]
-    path_costs_hex = [b.hex() for b in serialized_costs]
+def iter_decision_like(context_bytes: bytes, ct_bytes: bytes, op_stats=None,
+                       model_id: str = DEFAULT_MODEL_ID):
+    """
+    Streaming variant of evaluate_decision_like.
 
-    # 6) Return both node_scores and path_costs (for debugging and flexibility)
+    Loads the context and input eagerly (so bad input raises before anything
+    is sent), then returns a generator yielding ("node", i, bytes) for every
+    node score followed by ("cost", leaf, bytes) for every path cost, each
+    serialized as soon as it is computed.
+
+    If op_stats (profiling.OpStats) is given, every homomorphic op and
+    serialization is counted and timed into it.
+    """
+    enc_input = _load_encrypted_input(context_bytes, ct_bytes, op_stats)
+    return _generate_model(enc_input, _get_model(model_id))
+
+
+def evaluate_decision_like(context_bytes: bytes, ct_bytes: bytes, op_stats=None,
+                           model_id: str = DEFAULT_MODEL_ID) -> bytes:
+    """
+    Server entry point.
+
+    Args:
+        context_bytes: serialized TenSEAL context (public).
+        ct_bytes: serialized CKKSVector encoding [x_0, ..., x_{d-1}, 1.0].
+        op_stats: optional profiling.OpStats collecting per-op timings.
+        model_id: model to evaluate (see model_path).
+
+    Returns:
+        JSON bytes:
+        {
+          "node_scores": [hex(serialized_score_0), ...],
+          "path_costs":  [hex(serialized_cost_leaf0), ...]
+        }
+    """
+    node_scores_hex = []
+    path_costs_hex = []
+    for kind, _, blob in iter_decision_like(context_bytes, ct_bytes, op_stats=op_stats,
+                                            model_id=model_id):
+        if kind == "node":
+            node_scores_hex.append(blob.hex())
+        else:
+            path_costs_hex.append(blob.hex())
+
+    # Return both node_scores and path_costs (for debugging and flexibility)
     return json.dumps(
         {
             "node_scores": node_scores_hex,
@@ -134,6 +271,41 @@ def evaluate_decision_like(context_bytes: bytes, ct_bytes: bytes) -> bytes:
         }
     ).encode("utf-8")
 
+
+def evaluate_multi(context_bytes: bytes, ct_bytes: bytes, model_ids: list, op_stats=None) -> bytes:
+    """
+    Evaluate several models on one encrypted input.
+
+    The context and ciphertext are deserialized once, and node scores for
+    decision rows shared between the models (same feature and threshold)
+    are computed once and reused.
+
+    Returns:
+        JSON bytes:
+        {
+          "models": {
+            model_id: {"node_scores": [...], "path_costs": [...]},
+            ...
+          }
+        }
+    """
+    enc_input = _load_encrypted_input(context_bytes, ct_bytes, op_stats)
+    score_cache = {}
+    results = {}
+    for model_id in model_ids:
+        node_scores_hex = []
+        path_costs_hex = []
+        for kind, _, blob in _generate_model(enc_input, _get_model(model_id), score_cache):
+            if kind == "node":
+                node_scores_hex.append(blob.hex())
+            else:
+                path_costs_hex.append(blob.hex())
+        results[model_id] = {
+            "node_scores": node_scores_hex,
+            "path_costs": path_costs_hex,
+        }
+    return json.dumps({"models": results}).encode("utf-8")
+
 # ---------------------------------------------------------------------
 # Local test when running `python fhe_logic.py`
 # ---------------------------------------------------------------------
@@ -200,7 +372,7 @@ def _local_plaintext_test():
         first_cost_vec = ts.CKKSVector.load(ctx, first_cost_ct)
     first_cost_plain = first_cost_vec.decrypt()[0]
 
-    print(f"First decision row:  {_DECISION_MATRIX[0]}")
+    print(f"First decision row:  {_get_model()['decision_matrix'][0]}")
     print(f"Decrypted first node score: {first_score_plain}")
     print(f"Decrypted first path cost : {first_cost_plain}")
     print("=" * 60)
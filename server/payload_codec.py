@@ -0,0 +1,48 @@
+# server/payload_codec.py
+"""
+Offset-based parsing of the decrypted AES payload.
+
+Client format (build_wrapped_payload in client.py):
+  b"TS_CTX::" + base64(context_bytes) + b"::TS_CT::" + base64(ciphertext_bytes)
+
+The fields are located with find() and base64-decoded straight out of a
+memoryview of the decrypted buffer, so the multi-MB context is never copied
+by split() or by slicing before decoding.
+"""
+
+import binascii
+
+CTX_TAG = b"TS_CTX::"
+CT_TAG = b"::TS_CT::"
+
+
+def split_fhe_payload(decrypted):
+    """
+    Extract (context_bytes, ciphertext_bytes) from a decrypted payload.
+
+    Either value is None if it could not be found or decoded. A payload
+    without the TS_CTX tag is treated as a bare ciphertext.
+    """
+    if not decrypted:
+        return None, None
+    if not decrypted.startswith(CTX_TAG):
+        # If you ever switch to "decrypted is just ciphertext", this branch is used
+        return None, decrypted
+
+    ctx_start = len(CTX_TAG)
+    ctx_end = decrypted.find(CT_TAG, ctx_start)
+    if ctx_end == -1:
+        return None, None
+    ct_start = ctx_end + len(CT_TAG)
+
+    view = memoryview(decrypted)
+    try:
+        # a2b_base64 accepts any buffer, so the slices are zero-copy views
+        context_bytes = binascii.a2b_base64(view[ctx_start:ctx_end])
+        ciphertext_bytes = binascii.a2b_base64(view[ct_start:])
+    except binascii.Error:
+        return None, None
+    finally:
+        view.release()
+
+    return context_bytes, ciphertext_bytes
@@ -0,0 +1,224 @@
+# server/profiling.py
+"""
+Opt-in per-request profiling of the FHE evaluator.
+
+A request is profiled when it carries the header in PROFILING["header"]
+(e.g. "X-Profile: 1") or is picked by PROFILING["sample_rate"]. Profiling
+runs the evaluation under cProfile and wraps the encrypted input in
+ProfiledVector, which counts and times every homomorphic op (dot, scalar
+multiply, add) and serialization. The cProfile data is stored as a pstats
+file keyed by request id; the op summary is returned with the response.
+
+The header can be sent by any client, so header-triggered profiles are
+limited to PROFILING["header_per_minute"] per process (set "header" to
+None to ignore it). A stored profile is never overwritten: if the caller's
+X-Request-Id is already taken, a fresh id is used and returned in the
+summary. After each dump the profile directory is pruned to the newest
+PROFILING["max_files"] files, none older than PROFILING["max_age_s"].
+
+Only one cProfile profiler can be active per process (from Python 3.12
+enabling a second one raises ValueError), so a request that is profiled
+while another profile is running gets the op summary only, without a
+pstats file. From 3.12 the profiler also records calls from all threads,
+so a pstats file can include work of other requests served concurrently;
+the op summary is always per request.
+
+Nothing here is executed for requests that are not profiled.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+
+from shared.config import PROFILING
+
+PROFILE_DIR = PROFILING["dir"] or os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+# Held while a cProfile profiler is active in this process
+_profiler_lock = threading.Lock()
+
+# Start times of header-triggered profiles within the last minute
+_header_times = deque()
+_header_lock = threading.Lock()
+
+
+class OpStats:
+    """Per-op call counts and cumulative wall time."""
+
+    def __init__(self):
+        self.counts = {}
+        self.times = {}
+
+    def record(self, op: str, seconds: float):
+        self.counts[op] = self.counts.get(op, 0) + 1
+        self.times[op] = self.times.get(op, 0.0) + seconds
+
+    def as_dict(self) -> dict:
+        return {
+            op: {"count": self.counts[op], "total_ms": self.times[op] * 1000}
+            for op in sorted(self.counts)
+        }
+
+
+class ProfiledVector:
+    """
+    Wraps a CKKSVector and records the ops used by fhe_logic into OpStats.
+    Results of vector ops are wrapped too, so a whole evaluation is covered
+    by wrapping only the input.
+    """
+
+    __slots__ = ("inner", "stats")
+
+    def __init__(self, inner, stats: OpStats):
+        self.inner = inner
+        self.stats = stats
+
+    def _timed(self, op, fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        self.stats.record(op, time.perf_counter() - t0)
+        return out
+
+    def dot(self, other):
+        return ProfiledVector(self._timed("dot", self.inner.dot, other), self.stats)
+
+    def __mul__(self, scalar):
+        return ProfiledVector(self._timed("scalar_multiply", self.inner.__mul__, scalar), self.stats)
+
+    def __iadd__(self, other):
+        other = other.inner if isinstance(other, ProfiledVector) else other
+        self.inner = self._timed("add", self.inner.__iadd__, other)
+        return self
+
+    def serialize(self):
+        return self._timed("serialize", self.inner.serialize)
+
+
+def _header_allowed() -> bool:
+    """Take one slot of the header_per_minute budget, if any is left."""
+    now = time.monotonic()
+    with _header_lock:
+        while _header_times and now - _header_times[0] >= 60:
+            _header_times.popleft()
+        if len(_header_times) >= PROFILING["header_per_minute"]:
+            return False
+        _header_times.append(now)
+        return True
+
+
+def should_profile(headers) -> bool:
+    header = PROFILING["header"]
+    if header and headers.get(header, "").lower() in ("1", "true", "yes") and _header_allowed():
+        return True
+    rate = PROFILING["sample_rate"]
+    return rate > 0 and random.random() < rate
+
+
+def request_id_from(headers) -> str:
+    """X-Request-Id if it is a safe file name, otherwise a fresh id."""
+    rid = headers.get("X-Request-Id", "")
+    return rid if _REQUEST_ID_RE.match(rid) else uuid.uuid4().hex
+
+
+def profile_path(request_id: str) -> str:
+    if not _REQUEST_ID_RE.match(request_id):
+        raise ValueError("invalid request id")
+    return os.path.join(PROFILE_DIR, f"{request_id}.prof")
+
+
+def _prune_profiles():
+    """Delete pstats files past max_age_s, then the oldest beyond max_files."""
+    now = time.time()
+    entries = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith(".prof"):
+            continue
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            mtime = os.path.getmtime(path)
+            if now - mtime > PROFILING["max_age_s"]:
+                os.remove(path)
+            else:
+                entries.append((mtime, path))
+        except OSError:
+            continue
+    entries.sort()
+    for _, path in entries[:max(0, len(entries) - PROFILING["max_files"])]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _start_profiler():
+    """An enabled cProfile.Profile, or None if another profile is running."""
+    if not _profiler_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (e.g. a debugger) owns sys.monitoring
+        _profiler_lock.release()
+        return None
+    return profiler
+
+
+def run_profiled(request_id: str, fn, *args):
+    """
+    Call fn(*args, op_stats=OpStats()) under cProfile.
+
+    Returns (result, summary) where summary holds the op stats, total time
+    and the name of the stored pstats file. If another request is being
+    profiled, only the op stats are collected and "pstats" is None. On
+    Python 3.12+ the pstats data covers all threads (see module docstring).
+    The summary's "request_id" is the id the profile was stored under; it
+    differs from the given one if that was already in use.
+    """
+    stats = OpStats()
+    t0 = time.perf_counter()
+    profiler = _start_profiler()
+    if profiler is None:
+        result = fn(*args, op_stats=stats)
+        total = time.perf_counter() - t0
+        pstats_name = None
+    else:
+        try:
+            try:
+                result = fn(*args, op_stats=stats)
+            finally:
+                profiler.disable()
+            total = time.perf_counter() - t0
+            # Still under the lock, so no other dump can take the same name
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            if os.path.exists(profile_path(request_id)):
+                request_id = uuid.uuid4().hex
+            path = profile_path(request_id)
+            profiler.dump_stats(path)
+            pstats_name = os.path.basename(path)
+            _prune_profiles()
+        finally:
+            _profiler_lock.release()
+
+    return result, {
+        "request_id": request_id,
+        "total_ms": total * 1000,
+        "ops": stats.as_dict(),
+        "pstats": pstats_name,
+    }
+
+
+def load_profile_text(request_id: str, limit: int = 40) -> str:
+    """Human-readable pstats report for a stored profile (cumulative order)."""
+    out = io.StringIO()
+    pstats.Stats(profile_path(request_id), stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
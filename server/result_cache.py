@@ -0,0 +1,93 @@
+# server/result_cache.py
+"""
+Results of requests that carry an idempotency key, kept for RESULT_TTL
+seconds so that a retried request is answered without evaluating it again.
+Concurrent duplicates wait for the running evaluation instead of starting
+another one.
+
+The cache lives in process memory. Under serve_prefork.py each worker has
+its own, so a retry that lands on another worker is evaluated again (the
+same holds for the nonce replay cache).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from shared.config import RESULT_CACHE
+
+RESULT_TTL = RESULT_CACHE["ttl_s"]
+MAX_ENTRIES = RESULT_CACHE["max_entries"]
+MAX_BYTES = RESULT_CACHE["max_bytes"]
+
+# key -> (expires_at, result_bytes), least recently used first
+result_store = OrderedDict()
+_store_bytes = 0
+# key -> _InFlight for evaluations currently running
+_in_flight = {}
+_lock = threading.Lock()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _evict(now):
+    global _store_bytes
+    expired = [k for k, (exp, _) in result_store.items() if exp < now]
+    for k in expired:
+        _store_bytes -= len(result_store.pop(k)[1])
+    while result_store and (len(result_store) > MAX_ENTRIES or _store_bytes > MAX_BYTES):
+        _, (_, blob) = result_store.popitem(last=False)
+        _store_bytes -= len(blob)
+
+
+def get_or_compute(key, compute, on_wait=None):
+    """
+    Return (result_bytes, cached) for 'key'.
+
+    A fresh cached result is returned as is. If the same key is already being
+    evaluated, wait for that evaluation instead of starting another one, so a
+    retry storm costs a single evaluation; on_wait() is called before waiting
+    (the server uses it to give back the duplicate's admission ticket).
+    Otherwise call compute() and cache its result. Errors are passed to
+    waiting duplicates but not cached.
+    """
+    global _store_bytes
+    with _lock:
+        now = time.time()
+        _evict(now)
+        entry = result_store.get(key)
+        if entry is not None:
+            result_store.move_to_end(key)
+            return entry[1], True
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = _InFlight()
+
+    if not leader:
+        if on_wait is not None:
+            on_wait()
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    try:
+        flight.result = compute()
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _in_flight[key]
+            if flight.error is None and len(flight.result) <= MAX_BYTES:
+                result_store[key] = (time.time() + RESULT_TTL, flight.result)
+                _store_bytes += len(flight.result)
+                _evict(time.time())
+        flight.done.set()
+    return flight.result, False
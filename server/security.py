@@ -1,10 +1,12 @@
-import base64
+import binascii
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from shared.config import AES_KEY
 
 aesgcm = AESGCM(AES_KEY)
 
-def decrypt_payload(iv_b64, ct_b64):
-    iv = base64.b64decode(iv_b64)
-    ct = base64.b64decode(ct_b64)
-    return aesgcm.decrypt(iv, ct, None)
+def decrypt_payload(iv_b64, ct_b64, aad=None):
+    # a2b_base64 takes the JSON str directly, avoiding an intermediate
+    # ASCII-encoded copy of the (multi-MB) ciphertext
+    iv = binascii.a2b_base64(iv_b64)
+    ct = binascii.a2b_base64(ct_b64)
+    return aesgcm.decrypt(iv, ct, aad)
@@ -0,0 +1,121 @@
+# server/serve_prefork.py
+"""
+Preload-then-fork server.
+
+The parent imports the Flask app, loads and compiles the FHE model once,
+freezes the GC so those objects are never touched again (keeping their
+pages shared copy-on-write), binds the listening socket and then forks
+N workers that all accept on it.
+
+Per-process state is NOT shared between workers:
+  - the admission memory budget / concurrency cap is split evenly,
+  - the nonce replay cache is per worker, so a replayed nonce is only
+    detected if it lands on the same worker,
+  - the idempotent result cache is per worker, so a retry that lands on
+    another worker is evaluated again.
+
+Cold start (import, model load) and per-worker spawn times are printed.
+
+Usage:
+  python server/serve_prefork.py --workers 4 --port 5000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+
+def _run_worker(app, host, port, fd, forked_at, index):
+    from werkzeug.serving import make_server
+
+    srv = make_server(host, port, app, threaded=True, fd=fd)
+    ready_ms = (time.monotonic() - forked_at) * 1000
+    print(f"[worker {index}] pid={os.getpid()} ready {ready_ms:.1f} ms after fork", flush=True)
+    try:
+        srv.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preload the FHE model, then fork workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--uds", help="listen on this Unix domain socket path instead of TCP")
+    args = parser.parse_args()
+
+    # 1) Import the app (Flask, TenSEAL, numpy, ...)
+    t0 = time.perf_counter()
+    import server as server_app
+    t_import = time.perf_counter() - t0
+
+    # 2) Load + compile the models once in the parent
+    t0 = time.perf_counter()
+    model_ids = server_app.load_all_models()
+    t_load = time.perf_counter() - t0
+    print(f"[parent] import {t_import * 1000:.1f} ms, "
+          f"loaded {len(model_ids)} model(s) in {t_load * 1000:.1f} ms")
+
+    # Divide admission limits between workers
+    admission = server_app.admission
+    admission.memory_budget_bytes //= args.workers
+    admission.max_concurrent = max(admission.max_concurrent // args.workers, 1)
+
+    # 3) Move everything allocated so far into the permanent GC generation,
+    #    so collections in workers don't write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+    # 4) Bind once in the parent; workers inherit the listening socket
+    if args.uds:
+        if os.path.exists(args.uds):
+            os.unlink(args.uds)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(args.uds)
+        host, address = f"unix://{args.uds}", args.uds
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((args.host, args.port))
+        host, address = args.host, f"http://{args.host}:{args.port}"
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    children = []
+    t0 = time.perf_counter()
+    for i in range(args.workers):
+        forked_at = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            _run_worker(server_app.app, host, args.port, sock.fileno(), forked_at, i)
+        children.append(pid)
+    print(f"[parent] forked {args.workers} workers in {(time.perf_counter() - t0) * 1000:.1f} ms "
+          f"on {address}")
+
+    def _shutdown(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ import os
 import sys
 import time
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 
 # ------------------------------------------------------------------
 # Simple local imports (run from server/ directory)
@@ -13,108 +13,398 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from fhe_logic import evaluate_decision_like
+from admission import AdmissionController, AdmissionRejected, estimate_cost
+from fhe_logic import (
+    evaluate_decision_like,
+    evaluate_multi,
+    iter_decision_like,
+    load_all_models,
+    model_exists,
+    model_stats,
+)
 from nonce_cache import is_replay
+from payload_codec import split_fhe_payload
+from profiling import load_profile_text, request_id_from, run_profiled, should_profile
+from result_cache import get_or_compute
 from security import decrypt_payload
+from shared.config import ADMISSION
+from shared.framing import FRAME_COST, FRAME_END, FRAME_ERROR, FRAME_NODE, encode_frame
 
 app = Flask(__name__)
+# Larger bodies are rejected with 413 before being read
+app.config["MAX_CONTENT_LENGTH"] = ADMISSION["max_request_bytes"]
 
+admission = AdmissionController(
+    memory_budget_bytes=ADMISSION["memory_budget_bytes"],
+    max_concurrent=ADMISSION["max_concurrent"],
+    max_queued_per_client=ADMISSION["max_queued_per_client"],
+    queue_timeout_s=ADMISSION["queue_timeout_s"],
+    client_weights=ADMISSION["client_weights"],
+)
 
-@app.route("/infer", methods=["POST"])
-def infer():
+
+def _admit(client_id, content_length: int, streaming: bool = False, stats: dict = None):
     """
-    Expected JSON from client:
+    Wait for admission of a request of 'content_length' bytes evaluated
+    against a model of size 'stats' (default: the default model).
 
-    {
-      "nonce": "<base64>",            # unique per request
-      "timestamp": <unix_ts>,         # float or int
-      "payload": {
-         "iv": "<base64>",            # AES-GCM IV
-         "ct": "<base64>"             # AES-GCM ciphertext wrapping FHE data
-      }
-      // NOTE: we do NOT require explicit "fhe_context" / "ciphertext" fields,
-      // because both context and ciphertext are inside the AES-wrapped payload
-      // as: b"TS_CTX::" + base64(context_bytes) + b"::TS_CT::" + base64(ciphertext_bytes)
-    }
+    Returns (ticket, None) or (None, (error_body, status, headers)).
+    """
+    mem, cpu = estimate_cost(content_length or 0, stats or model_stats(), streaming=streaming)
+    try:
+        return admission.acquire(client_id, mem, cpu), None
+    except AdmissionRejected as e:
+        headers = {"Retry-After": "1"} if e.status in (429, 503) else {}
+        return None, ({"error": e.reason}, e.status, headers)
+
+
+def _client_id():
+    """
+    Fair-scheduling identity of the current HTTP request: the configured
+    header (X-Client-Id by default), falling back to the peer address.
+    The header is self-declared, not authenticated (see admission.py).
+    """
+    header = ADMISSION["client_id_header"]
+    return (header and request.headers.get(header)) or request.remote_addr
+
+
+def _unwrap_request(data):
+    """
+    Validate the request JSON and extract the FHE context and ciphertext.
+
+    Returns ((fhe_context_bytes, ciphertext_bytes), None) on success, or
+    (None, (error_body, status)) describing the error.
     """
-    data = request.get_json(force=True)
     if not data:
-        return jsonify({"error": "invalid json"}), 400
+        return None, ({"error": "invalid json"}, 400)
 
     nonce = data.get("nonce")
     timestamp = data.get("timestamp")
     payload = data.get("payload")
 
     if nonce is None or timestamp is None or payload is None:
-        return jsonify({"error": "missing fields"}), 400
+        return None, ({"error": "missing fields"}, 400)
 
     # 1. Timestamp freshness check (optional, relaxed for development)
     try:
         ts_val = float(timestamp)
     except Exception:
-        return jsonify({"error": "invalid timestamp"}), 400
+        return None, ({"error": "invalid timestamp"}, 400)
 
     # For stricter security later:
     # if abs(time.time() - ts_val) > 300:
-    #     return jsonify({"error": "timestamp outside allowed window"}), 400
+    #     return None, ({"error": "timestamp outside allowed window"}, 400)
+
+    # Optional idempotency key: authenticated as AES-GCM associated data
+    idempotency_key = data.get("idempotency_key")
+    if idempotency_key is not None and not (
+        isinstance(idempotency_key, str) and 0 < len(idempotency_key) <= 128
+    ):
+        return None, ({"error": "invalid idempotency_key"}, 400)
+    aad = idempotency_key.encode("utf-8") if idempotency_key else None
 
     # 2. Replay protection
     if is_replay(nonce):
-        return jsonify({"error": "replay detected"}), 403
+        return None, ({"error": "replay detected"}, 403)
 
     # 3. Decrypt AES-GCM payload (authenticity + integrity for FHE bytes)
     decrypted = None
     if isinstance(payload, dict) and "iv" in payload and "ct" in payload:
         try:
-            decrypted = decrypt_payload(payload["iv"], payload["ct"])
+            decrypted = decrypt_payload(payload["iv"], payload["ct"], aad)
         except Exception as e:
-            return (
-                jsonify(
-                    {
-                        "error": "AES-GCM verification failed",
-                        "detail": str(e),
-                        "hint": "Ensure client and server share AES_KEY and use the same payload format.",
-                    }
-                ),
+            return None, (
+                {
+                    "error": "AES-GCM verification failed",
+                    "detail": str(e),
+                    "hint": "Ensure client and server share AES_KEY and use the same payload format.",
+                },
                 400,
             )
     else:
-        return jsonify({"error": "invalid payload structure"}), 400
+        return None, ({"error": "invalid payload structure"}, 400)
 
     # 4. Extract FHE context and ciphertext from decrypted payload
     # Client format (build_wrapped_payload in client.py):
     #   b"TS_CTX::" + base64(context_bytes) + b"::TS_CT::" + base64(ciphertext_bytes)
-    fhe_context_bytes = None
-    ciphertext_bytes = None
-
-    try:
-        if decrypted and b"TS_CTX::" in decrypted:
-            parts = decrypted.split(b"::")
-            # Expected: [b"TS_CTX", base64_ctx, b"TS_CT", base64_ct]
-            if len(parts) >= 4 and parts[0] == b"TS_CTX" and parts[2] == b"TS_CT":
-                fhe_context_bytes = base64.b64decode(parts[1])
-                ciphertext_bytes = base64.b64decode(parts[3])
-        else:
-            # If you ever switch to "decrypted is just ciphertext", you can use this branch:
-            ciphertext_bytes = decrypted
-    except Exception:
-        # Parsing failed; leave bytes as None so we error clearly below
-        pass
+    # Fields are decoded in place from the decrypted buffer (no split() copies)
+    fhe_context_bytes, ciphertext_bytes = split_fhe_payload(decrypted)
 
     if fhe_context_bytes is None:
-        return jsonify({"error": "no fhe_context found in AES payload (TS_CTX missing)"}), 400
+        return None, ({"error": "no fhe_context found in AES payload (TS_CTX missing)"}, 400)
     if ciphertext_bytes is None:
-        return jsonify({"error": "no ciphertext found in AES payload (TS_CT missing)"}), 400
+        return None, ({"error": "no ciphertext found in AES payload (TS_CT missing)"}, 400)
+
+    return (fhe_context_bytes, ciphertext_bytes), None
+
+
+def _payload_iv(data) -> str:
+    """AES-GCM IV of a request; identical across retries of the same payload."""
+    return data["payload"]["iv"]
+
+
+def _model_ids(data):
+    """
+    Validate the "models" list of a /infer/multi request.
+
+    Returns (model_ids, None) with duplicates removed (first occurrence kept),
+    or (None, (error_body, status)).
+    """
+    models = data.get("models") if isinstance(data, dict) else None
+    if not isinstance(models, list) or not models:
+        return None, ({"error": "models must be a non-empty list of model ids"}, 400)
+    if not all(isinstance(m, str) for m in models):
+        return None, ({"error": "models must be a non-empty list of model ids"}, 400)
+    models = list(dict.fromkeys(models))
+    if len(models) > ADMISSION["max_models_per_request"]:
+        return None, ({"error": f"at most {ADMISSION['max_models_per_request']} models per request"}, 400)
+    unknown = [m for m in models if not model_exists(m)]
+    if unknown:
+        return None, ({"error": "unknown model", "models": unknown}, 404)
+    return models, None
+
+
+def _combined_stats(model_ids) -> dict:
+    """model_stats() summed over several models evaluated on one input."""
+    per_model = [model_stats(m) for m in model_ids]
+    return {key: sum(s[key] for s in per_model) for key in per_model[0]}
+
+
+def _evaluate_cached(data, headers, ticket, evaluate_fn, *args, cache_suffix: str = ""):
+    """
+    Run evaluate_fn(*args), under the profiler if requested via header or
+    sampling, and through the result cache if the request carries an
+    idempotency key. A duplicate that joins a running evaluation releases
+    its admission 'ticket' first, so a retry storm holds one slot, not N.
+
+    Returns (result_bytes, cached, profile_summary_or_None).
+    """
+    profile = None
+
+    def evaluate():
+        nonlocal profile
+        if should_profile(headers):
+            result, profile = run_profiled(request_id_from(headers), evaluate_fn, *args)
+            return result
+        return evaluate_fn(*args)
+
+    idempotency_key = data.get("idempotency_key")
+    if idempotency_key:
+        # A retry resends the same AES payload (same IV) with a new nonce;
+        # serve it from the result cache or join the running evaluation
+        cache_key = f"{idempotency_key}:{_payload_iv(data)}{cache_suffix}"
+        result_ct_bytes, cached = get_or_compute(
+            cache_key, evaluate, on_wait=lambda: admission.release(ticket))
+    else:
+        result_ct_bytes, cached = evaluate(), False
+    return result_ct_bytes, cached, profile
+
+
+def _result_response(result_ct_bytes, cached, profile, encode_result: bool):
+    # Return serialized encrypted result as base64 string
+    if encode_result:
+        result_ct_bytes = base64.b64encode(result_ct_bytes).decode("utf-8")
+    body = {"result": result_ct_bytes}
+    if profile is not None:
+        body["profile"] = profile
+    response_headers = {"X-Idempotent-Replay": "true"} if cached else {}
+    return body, 200, response_headers
+
+
+def handle_infer(load_data, headers, client_id, content_length: int, encode_result: bool = True):
+    """
+    Framework-independent /infer handler, shared by the Flask view and the
+    client's in-process transport.
+
+    load_data is called (after admission) to get the request JSON as a dict.
+    Returns (body, status, response_headers). With encode_result=False the
+    "result" field holds the raw result bytes instead of base64 text.
+    """
+    # 0. Admission control: the whole unwrap + evaluation runs under budget
+    ticket, error = _admit(client_id, content_length)
+    if error:
+        return error
+
+    try:
+        data = load_data()
+        fhe_bytes, error = _unwrap_request(data)
+        if error:
+            return error + ({},)
+        fhe_context_bytes, ciphertext_bytes = fhe_bytes
+
+        # 5. Run FHE evaluation (matrix × vector on encrypted data)
+        try:
+            result = _evaluate_cached(
+                data, headers, ticket, evaluate_decision_like, fhe_context_bytes, ciphertext_bytes,
+            )
+        except Exception as e:
+            return {"error": "FHE evaluation error", "detail": str(e)}, 500, {}
+
+        # 6. Return serialized encrypted result
+        return _result_response(*result, encode_result)
+    finally:
+        admission.release(ticket)
+
+
+def handle_infer_multi(load_data, headers, client_id, content_length: int, encode_result: bool = True):
+    """
+    Framework-independent /infer/multi handler: one encrypted input scored
+    against every model in the request's "models" list.
+
+    Unlike handle_infer, the JSON is loaded before admission, since the cost
+    estimate depends on the requested models (the body size is still capped
+    by MAX_CONTENT_LENGTH). Returns (body, status, response_headers).
+    """
+    data = load_data()
+    if not data:
+        return {"error": "invalid json"}, 400, {}
+    model_ids, error = _model_ids(data)
+    if error:
+        return error + ({},)
+
+    ticket, error = _admit(client_id, content_length, stats=_combined_stats(model_ids))
+    if error:
+        return error
+
+    try:
+        fhe_bytes, error = _unwrap_request(data)
+        if error:
+            return error + ({},)
+        fhe_context_bytes, ciphertext_bytes = fhe_bytes
+
+        try:
+            result = _evaluate_cached(
+                data, headers, ticket, evaluate_multi, fhe_context_bytes, ciphertext_bytes, model_ids,
+                cache_suffix=":" + ",".join(model_ids),
+            )
+        except Exception as e:
+            return {"error": "FHE evaluation error", "detail": str(e)}, 500, {}
+
+        return _result_response(*result, encode_result)
+    finally:
+        admission.release(ticket)
+
+
+@app.route("/infer", methods=["POST"])
+def infer():
+    """
+    Expected JSON from client:
+
+    {
+      "nonce": "<base64>",            # unique per request
+      "timestamp": <unix_ts>,         # float or int
+      "idempotency_key": "<str>",     # optional, stable across retries;
+                                      # AES-GCM associated data of payload
+      "payload": {
+         "iv": "<base64>",            # AES-GCM IV
+         "ct": "<base64>"             # AES-GCM ciphertext wrapping FHE data
+      }
+      // NOTE: we do NOT require explicit "fhe_context" / "ciphertext" fields,
+      // because both context and ciphertext are inside the AES-wrapped payload
+      // as: b"TS_CTX::" + base64(context_bytes) + b"::TS_CT::" + base64(ciphertext_bytes)
+    }
+    """
+    body, status, headers = handle_infer(
+        lambda: request.get_json(force=True),
+        request.headers,
+        _client_id(),
+        request.content_length,
+    )
+    return jsonify(body), status, headers
+
+
+@app.route("/infer/multi", methods=["POST"])
+def infer_multi():
+    """
+    Same request format as /infer plus a list of model ids:
+
+    {
+      ...,
+      "models": ["default", "segment_a", ...]   # ids under server/model/
+    }
+
+    The result decodes to {"models": {model_id: {"node_scores": [...],
+    "path_costs": [...]}}}, one entry per requested model.
+    """
+    body, status, headers = handle_infer_multi(
+        lambda: request.get_json(force=True),
+        request.headers,
+        _client_id(),
+        request.content_length,
+    )
+    return jsonify(body), status, headers
 
-    # 5. Run FHE evaluation (matrix × vector on encrypted data)
+
+@app.route("/infer/stream", methods=["POST"])
+def infer_stream():
+    """
+    Same request format as /infer, but the result is streamed as binary
+    frames (see shared/framing.py): one frame per node score ciphertext as
+    soon as it is computed, then one per path cost, then an end frame.
+    Nothing is hex/base64-encoded and the full result is never held in memory.
+    """
+    ticket, error = _admit(_client_id(), request.content_length, streaming=True)
+    if error:
+        body, status, headers = error
+        return jsonify(body), status, headers
+
+    # Until the streaming response owns the ticket, every exit releases it
+    streaming = False
     try:
-        result_ct_bytes = evaluate_decision_like(fhe_context_bytes, ciphertext_bytes)
-    except Exception as e:
-        return jsonify({"error": "FHE evaluation error", "detail": str(e)}), 500
+        fhe_bytes, error = _unwrap_request(request.get_json(force=True, silent=True))
+        if error:
+            body, status = error
+            return jsonify(body), status
+        fhe_context_bytes, ciphertext_bytes = fhe_bytes
+
+        # Context/input deserialization happens here, so bad input still gets a JSON 500
+        try:
+            results = iter_decision_like(fhe_context_bytes, ciphertext_bytes)
+        except Exception as e:
+            return jsonify({"error": "FHE evaluation error", "detail": str(e)}), 500
 
-    # 6. Return serialized encrypted result as base64 string
-    return jsonify({"result": base64.b64encode(result_ct_bytes).decode("utf-8")}), 200
+        def generate():
+            try:
+                for kind, index, blob in results:
+                    frame_kind = FRAME_NODE if kind == "node" else FRAME_COST
+                    yield encode_frame(frame_kind, index, blob)
+            except Exception as e:
+                # Headers are already sent; report the failure in-band
+                yield encode_frame(FRAME_ERROR, 0, str(e).encode("utf-8"))
+                return
+            yield encode_frame(FRAME_END, 0)
+
+        response = Response(generate(), mimetype="application/octet-stream")
+        # Resources stay reserved until the stream is fully sent (or aborted)
+        response.call_on_close(lambda: admission.release(ticket))
+        streaming = True
+        return response
+    finally:
+        if not streaming:
+            admission.release(ticket)
+
+
+@app.route("/profile/<request_id>", methods=["GET"])
+def get_profile(request_id):
+    """pstats report (cumulative order) for a request profiled earlier."""
+    try:
+        text = load_profile_text(request_id)
+    except (ValueError, OSError):
+        return jsonify({"error": "profile not found"}), 404
+    return Response(text, mimetype="text/plain")
 
 
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="FHE decision-tree inference server.")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--uds", help="listen on this Unix domain socket path instead of TCP")
+    args = parser.parse_args()
+
+    # Load the models before serving so the first request doesn't pay for it
+    load_all_models()
+    if args.uds:
+        app.run(host=f"unix://{args.uds}", debug=True)
+    else:
+        app.run(port=args.port, debug=True)
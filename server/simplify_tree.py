@@ -0,0 +1,183 @@
+# server/simplify_tree.py
+"""
+Compile-time simplification of the extracted tree (convert_tree.py output)
+before it is turned into FHE matrices by build_matrices.py.
+
+Every distinct split costs one homomorphic dot product (by far the most
+expensive op), every node costs one response ciphertext, and every node on
+a leaf's path costs a scalar multiply + add in the path-cost step, so
+removing nodes shrinks the whole encrypted circuit:
+
+  1. Splits implied by ancestor constraints are removed: under an ancestor
+     that already forces x[f] <= a (or x[f] > b), a split on x[f] <= t with
+     t >= a (or t <= b) always goes the same way.
+  2. Subtrees whose leaves all predict the same class are collapsed into a
+     single leaf (applied bottom-up, so whole same-class subtrees go).
+
+Both rewrites keep predictions identical for every input; verify_equivalence
+additionally checks this on data.
+"""
+
+import numpy as np
+
+_LEAF = -2       # sklearn feature/threshold marker for leaves
+_NO_CHILD = -1
+
+
+def _collect(tree_data, node, bounds):
+    """
+    Return the simplified subtree at 'node' as nested tuples:
+      ("leaf", value)  or  ("split", feature, threshold, left, right)
+    bounds maps feature -> (low, high): ancestors force low < x[f] <= high.
+
+    Post-order walk with an explicit stack (sklearn trees can be deeper
+    than the recursion limit): a "visit" item pushes its children and a
+    "join" item, which combines the two finished subtrees on 'done'.
+    """
+    children_left = tree_data['children_left']
+    children_right = tree_data['children_right']
+    done = []
+    stack = [("visit", node, bounds)]
+    while stack:
+        item = stack.pop()
+        if item[0] == "join":
+            _, f, t = item
+            right_sub = done.pop()
+            left_sub = done.pop()
+            # Same-class subtree: both sides are (already collapsed) identical leaves
+            if left_sub[0] == "leaf" and right_sub[0] == "leaf" and left_sub[1] == right_sub[1]:
+                done.append(left_sub)
+            else:
+                done.append(("split", f, t, left_sub, right_sub))
+            continue
+
+        _, node, bounds = item
+        while children_left[node] != children_right[node]:
+            f = int(tree_data['features'][node])
+            t = float(tree_data['thresholds'][node])
+            low, high = bounds.get(f, (-np.inf, np.inf))
+            # Split implied by ancestors: only one branch is reachable
+            if high <= t:
+                node = children_left[node]
+            elif t <= low:
+                node = children_right[node]
+            else:
+                stack.append(("join", f, t))
+                stack.append(("visit", children_right[node], {**bounds, f: (t, high)}))
+                stack.append(("visit", children_left[node], {**bounds, f: (low, t)}))
+                break
+        else:
+            done.append(("leaf", tree_data['leaf_values'][node]))
+    return done[0]
+
+
+def _flatten(root, tree_data):
+    """Number the nested tree in pre-order (like sklearn) and build arrays."""
+    thresholds, features, children_left, children_right, leaf_values = [], [], [], [], []
+
+    # (subtree, parent index, child list the parent links it from)
+    stack = [(root, None, None)]
+    while stack:
+        sub, parent, links = stack.pop()
+        idx = len(thresholds)
+        if parent is not None:
+            links[parent] = idx
+        thresholds.append(float(_LEAF))
+        features.append(_LEAF)
+        children_left.append(_NO_CHILD)
+        children_right.append(_NO_CHILD)
+        if sub[0] == "leaf":
+            leaf_values.append(sub[1])
+            continue
+        leaf_values.append(None)
+        _, f, t, left_sub, right_sub = sub
+        thresholds[idx] = t
+        features[idx] = f
+        # Left is popped first, so numbering stays pre-order
+        stack.append((right_sub, idx, children_right))
+        stack.append((left_sub, idx, children_left))
+
+    leaf_indices = [i for i, l in enumerate(children_left) if l == _NO_CHILD]
+    return {
+        'thresholds': np.array(thresholds),
+        'features': np.array(features),
+        'children_left': np.array(children_left),
+        'children_right': np.array(children_right),
+        'leaf_values': np.array(leaf_values, dtype=object),
+        'leaf_indices': np.array(leaf_indices),
+        'num_nodes': len(thresholds),
+        'n_features': tree_data['n_features'],
+        'classes': tree_data['classes'],
+    }
+
+
+def _homomorphic_ops(tree_data):
+    """
+    Return (dots, path_terms) as evaluated by fhe_logic: one dot product per
+    distinct decision row (split feature/threshold; all leaves share the
+    zero row) and one scalar multiply + add per (leaf, path node).
+    """
+    children_left = tree_data['children_left']
+    children_right = tree_data['children_right']
+    splits = {
+        (int(tree_data['features'][i]), float(tree_data['thresholds'][i]))
+        for i in range(len(children_left)) if children_left[i] != children_right[i]
+    }
+    dots = len(splits) + 1
+    path_terms = 0
+    stack = [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if children_left[node] == children_right[node]:
+            path_terms += depth
+        else:
+            stack.append((children_left[node], depth + 1))
+            stack.append((children_right[node], depth + 1))
+    return dots, path_terms
+
+
+def simplify_tree(tree_data):
+    """
+    Simplify an extracted tree. Returns (simplified_tree_data, report) where
+    report has node/leaf counts, dot products and path-cost terms (scalar
+    multiply + add) before and after. Dot products dominate evaluation time,
+    so dots_before / dots_after approximates the evaluation speedup better
+    than any total op count; measure with benchmarks/bench_evaluator.py.
+    """
+    simplified = _flatten(_collect(tree_data, 0, {}), tree_data)
+
+    dots_before, terms_before = _homomorphic_ops(tree_data)
+    dots_after, terms_after = _homomorphic_ops(simplified)
+    report = {
+        'nodes_before': int(tree_data['num_nodes']),
+        'nodes_after': int(simplified['num_nodes']),
+        'leaves_before': len(tree_data['leaf_indices']),
+        'leaves_after': len(simplified['leaf_indices']),
+        'dots_before': dots_before,
+        'dots_after': dots_after,
+        'path_terms_before': terms_before,
+        'path_terms_after': terms_after,
+    }
+    return simplified, report
+
+
+def predict_tree(tree_data, X):
+    """Plaintext sklearn-style traversal (x[f] <= threshold goes left)."""
+    X = np.asarray(X, dtype=np.float32)
+    preds = []
+    for x in X:
+        node = 0
+        while tree_data['children_left'][node] != tree_data['children_right'][node]:
+            if x[tree_data['features'][node]] <= tree_data['thresholds'][node]:
+                node = tree_data['children_left'][node]
+            else:
+                node = tree_data['children_right'][node]
+        preds.append(tree_data['leaf_values'][node])
+    return np.array(preds)
+
+
+def verify_equivalence(original, simplified, X):
+    """Raise ValueError if the two trees predict differently on any row of X."""
+    mismatches = int(np.sum(predict_tree(original, X) != predict_tree(simplified, X)))
+    if mismatches:
+        raise ValueError(f"Simplified tree disagrees with the original on {mismatches}/{len(X)} rows.")
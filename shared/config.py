@@ -1,4 +1,5 @@
 # shared/config.py
+import math
 import os
 
 # AES key (32 bytes for AES-256).
@@ -27,4 +28,88 @@ FHE_PARAMS = {
     "poly_modulus_degree": 8192,
     "coeff_mod_bit_sizes": [60, 40, 40, 60],
     "global_scale": 2**40,
-}
\ No newline at end of file
+}
+
+
+def _max_request_bytes(params: dict) -> int:
+    """
+    Request body cap derived from FHE parameters.
+
+    The body is dominated by the public context with Galois keys: one key per
+    rotation step (2*log2(N) - 2), each (primes - 1) pairs of polynomials of N
+    coefficients over all primes. The uncompressed size used here is about
+    twice what TenSEAL actually writes (measured 0.35-0.5x for N = 4096..16384).
+    The context is base64-encoded twice (inside the AES-GCM payload, then the
+    payload in the JSON), hence (4/3)**2. Default params: ~130 MiB cap for a
+    measured body of ~60 MiB.
+    """
+    n = params["poly_modulus_degree"]
+    primes = len(params["coeff_mod_bit_sizes"])
+    galois_keys = 2 * int(math.log2(n)) - 2
+    context_bound = galois_keys * (primes - 1) * 2 * 2 * n * primes * 8
+    ciphertext_bound = 2 * n * primes * 8
+    return int((context_bound + ciphertext_bound) * (4 / 3) ** 2) + 1024 * 1024
+
+
+# Server admission control (see server/admission.py).
+#   max_request_bytes     : hard cap on request body size (HTTP 413 above it),
+#                           derived from FHE_PARAMS with ~2x headroom (see above)
+#   memory_budget_bytes   : estimated memory of all admitted requests combined
+#   max_concurrent        : evaluations running at once (CPU-bound, ~1 core each)
+#   max_queued_per_client : waiting requests per client identity (HTTP 429 above it)
+#   queue_timeout_s       : max time a request waits for admission (HTTP 503 after it)
+#   client_weights        : fair-share weight per client id, default 1
+#   client_id_header      : request header naming the client for fair scheduling.
+#                           It is not authenticated, so a client can use many ids
+#                           to get more queue slots; None keys on the peer address.
+#   max_models_per_request: model ids accepted by one /infer/multi request
+ADMISSION = {
+    "max_request_bytes": _max_request_bytes(FHE_PARAMS),
+    "memory_budget_bytes": 2 * 1024 * 1024 * 1024,
+    "max_concurrent": os.cpu_count() or 4,
+    "max_queued_per_client": 8,
+    "queue_timeout_s": 30.0,
+    "client_weights": {},
+    "client_id_header": "X-Client-Id",
+    "max_models_per_request": 16,
+}
+
+# Opt-in per-request profiling of the evaluator (see server/profiling.py).
+#   header            : request header that turns profiling on ("1"/"true");
+#                       None ignores the header (sampling only)
+#   header_per_minute : header-triggered profiles allowed per minute and
+#                       process; later requests are served unprofiled
+#   sample_rate       : fraction of requests profiled without the header (0 = off)
+#   dir               : where pstats files are stored (None = server/profiles/)
+#   max_files         : newest pstats files kept in dir, older ones are deleted
+#   max_age_s         : pstats files older than this are deleted
+PROFILING = {
+    "header": "X-Profile",
+    "header_per_minute": 6,
+    "sample_rate": 0.0,
+    "dir": None,
+    "max_files": 100,
+    "max_age_s": 24 * 3600,
+}
+
+# Idempotent retries (see server/result_cache.py): results of requests that
+# carry an "idempotency_key" are kept for ttl_s seconds, bounded by entry
+# count and total size, so a retried request is not evaluated again.
+RESULT_CACHE = {
+    "ttl_s": 120,
+    "max_entries": 256,
+    "max_bytes": 256 * 1024 * 1024,
+}
+
+# Client transport (see client/transport.py).
+#   kind     : "http" (default), "uds" (Unix domain socket) or "inprocess"
+#              (call the server handler directly in the client process)
+#   url      : /infer URL for the http transport
+#   uds_path : socket path for the uds transport (server.py --uds PATH)
+#   timeout  : per-request timeout in seconds (http / uds)
+TRANSPORT = {
+    "kind": os.environ.get("FHE_TRANSPORT", "http"),
+    "url": os.environ.get("FHE_SERVER_URL", "http://127.0.0.1:5000/infer"),
+    "uds_path": os.environ.get("FHE_SERVER_UDS", "/tmp/fhe_infer.sock"),
+    "timeout": 10,
+}
@@ -0,0 +1,53 @@
+# shared/framing.py
+"""
+Binary framing for streamed inference results (/infer/stream).
+
+Each frame is:
+  kind (1 byte) | index (uint32, big-endian) | length (uint32, big-endian) | payload
+
+Kinds:
+  b"N"  serialized node score ciphertext, index = node
+  b"C"  serialized path cost ciphertext, index = leaf
+  b"E"  error raised mid-stream, payload = UTF-8 message
+  b"Z"  end of stream, empty payload
+"""
+
+import struct
+
+FRAME_NODE = b"N"
+FRAME_COST = b"C"
+FRAME_ERROR = b"E"
+FRAME_END = b"Z"
+
+_HEADER = struct.Struct(">cII")
+HEADER_SIZE = _HEADER.size
+
+
+def encode_frame(kind: bytes, index: int, payload: bytes = b"") -> bytes:
+    """Build one frame (header + payload)."""
+    return _HEADER.pack(kind, index, len(payload)) + payload
+
+
+def _read_exact(stream, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = stream.read(n - len(buf))
+        if not chunk:
+            raise EOFError(f"Stream ended after {len(buf)}/{n} bytes of a frame.")
+        buf += chunk
+    return bytes(buf)
+
+
+def read_frames(stream):
+    """
+    Yield (kind, index, payload) from a file-like object until the end frame.
+    Raises RuntimeError on an error frame and EOFError on a truncated stream.
+    """
+    while True:
+        kind, index, length = _HEADER.unpack(_read_exact(stream, HEADER_SIZE))
+        payload = _read_exact(stream, length) if length else b""
+        if kind == FRAME_END:
+            return
+        if kind == FRAME_ERROR:
+            raise RuntimeError(f"Server error mid-stream: {payload.decode('utf-8', 'replace')}")
+        yield kind, index, payload